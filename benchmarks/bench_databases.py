@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Benchmark of the v1 /db/ listing against the number of registered
+databases, comparing the joined default schema lookup with the former
+per-database (lazy) lookup. Runs against an in-memory SQLite store.
+
+Usage: bench_databases.py [N_DATABASES ...]
+"""
+
+import sys
+import timeit
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import joinedload, lazyload
+from sqlalchemy.pool import StaticPool
+
+from lsst.dax.metaserv import api_v1
+from lsst.dax.metaserv.api_model import Database
+from lsst.dax.metaserv.model import init_db, session_maker, MSDatabase, \
+    MSDatabaseSchema
+
+REPEAT = 5
+
+
+def make_app(n_databases):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    init_db(engine)
+    session = session_maker(engine)()
+    for i in range(n_databases):
+        db = MSDatabase(name="db%d" % i, conn_host="localhost",
+                        conn_port=3306)
+        session.add(db)
+        session.flush()
+        session.add(MSDatabaseSchema(db_id=db.id, name="schema%d" % i,
+                                     is_default_schema=True))
+    session.commit()
+    session.close()
+    app = Flask(__name__)
+    app.config["default_engine"] = engine
+    app.register_blueprint(api_v1.metaserv_api_v1, url_prefix='/meta/v1')
+    return app
+
+
+def run(app, loader):
+    engine = app.config["default_engine"]
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: statements.append(1))
+
+    def listing():
+        session = session_maker(engine)()
+        databases = session.query(MSDatabase).options(
+            loader(MSDatabase.default_schema)).all()
+        Database(many=True).dump(databases)
+        session.close()
+
+    with app.test_request_context("/meta/v1/db/"):
+        listing()
+        n_statements = len(statements)
+        elapsed = min(timeit.repeat(listing, number=1, repeat=REPEAT))
+    return elapsed, n_statements
+
+
+def main(sizes):
+    print("%10s %14s %8s %14s %8s" % ("databases", "joined (ms)", "stmts",
+                                      "lazy (ms)", "stmts"))
+    for n_databases in sizes:
+        app = make_app(n_databases)
+        joined, joined_statements = run(app, joinedload)
+        lazy, lazy_statements = run(app, lazyload)
+        print("%10d %14.2f %8d %14.2f %8d" % (
+            n_databases, joined * 1000, joined_statements,
+            lazy * 1000, lazy_statements))
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 500, 1000])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Benchmark of Operations.add_tables_and_columns, which inserts rows in
+bulk, against the former path (ORM objects, one flush per table), on a
+SQLite file standing in for the metadata store.
+
+Usage: bench_ingest.py [N_TABLES [N_COLUMNS]]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+
+from lsst.dax.metaserv.admin_cli import Operations
+from lsst.dax.metaserv.model import init_db, session_maker, MSDatabase, \
+    MSDatabaseSchema, MSDatabaseTable, MSDatabaseColumn
+from lsst.dax.metaserv.schema_utils import parse_schema_string
+
+from synthetic_ddl import generate_ddl
+
+
+def orm_add_tables_and_columns(session, schema, parsed_schema):
+    """The former implementation, less its print of every column."""
+    for table_name in parsed_schema:
+        table_data = parsed_schema[table_name]
+        table = MSDatabaseTable(
+            name=table_name,
+            schema_id=schema.id,
+            description=table_data.get("description", "")
+        )
+        session.add(table)
+        session.flush()
+        columns = table_data["columns"]
+        for col, ord_pos in zip(columns, range(len(columns))):
+            session.add(MSDatabaseColumn(
+                table_id=table.id,
+                name=col["name"],
+                description=col.get("description", ""),
+                ordinal=ord_pos,
+                ucd=col.get("ucd", ""),
+                unit=col.get("unit", ""),
+                nullable=col.get("nullable", True),
+                datatype=col.get("datatype", ""),
+                arraysize=col.get("arraysize", ""),
+            ))
+        session.flush()
+
+
+def run(add_tables_and_columns, parsed_schema):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        engine = create_engine("sqlite:///" + path)
+        init_db(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda *args: statements.append(1))
+        session = session_maker(engine)()
+        db = MSDatabase(name="db", conn_host="localhost", conn_port=3306)
+        session.add(db)
+        session.flush()
+        schema = MSDatabaseSchema(db_id=db.id, name="db_schema",
+                                  is_default_schema=True)
+        session.add(schema)
+        session.flush()
+        del statements[:]
+        start = time.time()
+        add_tables_and_columns(session, schema, parsed_schema)
+        session.commit()
+        elapsed = time.time() - start
+        session.close()
+        engine.dispose()
+        return elapsed, len(statements)
+    finally:
+        os.remove(path)
+
+
+def main(n_tables, n_columns):
+    ddl = io.StringIO()
+    generate_ddl(ddl, n_tables, n_columns)
+    parsed_schema = parse_schema_string(ddl.getvalue())
+    print("%d tables x %d columns" % (n_tables, n_columns))
+    print("%6s %10s %12s" % ("", "time (s)", "statements"))
+    for name, add in (("orm", orm_add_tables_and_columns),
+                      ("bulk", Operations.add_tables_and_columns)):
+        elapsed, n_statements = run(add, parsed_schema)
+        print("%6s %10.2f %12d" % (name, elapsed, n_statements))
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [200, 50][len(args):]))
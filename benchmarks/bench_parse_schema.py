@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Benchmark of schema_utils.parse_schema, the single-pass parser, against
+parse_schema_regex, the original implementation (tests/schema_regex_parser.py).
+
+Without arguments, a synthetic DDL file is generated (see
+synthetic_ddl.py); otherwise each argument is parsed, e.g.
+cat/sql/baselineSchema.sql.
+
+Usage: bench_parse_schema.py [DDL_FILE ...]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+from lsst.dax.metaserv.schema_utils import parse_schema
+
+from synthetic_ddl import write_ddl
+
+# The reference implementation lives with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "tests"))
+from schema_regex_parser import parse_schema_regex
+
+REPEAT = 5
+N_TABLES = 200
+N_COLUMNS = 50
+
+
+def bench(path):
+    assert parse_schema(path) == parse_schema_regex(path)
+    n_lines = sum(1 for _ in open(path))
+    print("%s: %d lines" % (os.path.basename(path), n_lines))
+    for name, parse in (("regex", parse_schema_regex),
+                        ("single-pass", parse_schema)):
+        elapsed = min(timeit.repeat(lambda: parse(path), number=1,
+                                    repeat=REPEAT))
+        print("%12s %10.2f ms %10.0f lines/s" %
+              (name, elapsed * 1000, n_lines / elapsed))
+
+
+def main(paths):
+    if paths:
+        for path in paths:
+            bench(path)
+        return
+    fd, path = tempfile.mkstemp(suffix=".sql")
+    os.close(fd)
+    try:
+        write_ddl(path, N_TABLES, N_COLUMNS)
+        bench(path)
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
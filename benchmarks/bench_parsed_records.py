@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Memory held by a parsed schema, measured with tracemalloc: the slotted
+ParsedTable/ParsedColumn/ParsedIndex records returned by parse_schema,
+against the nested dicts returned by parse_schema_regex.
+
+Usage: bench_parsed_records.py [N_TABLES [N_COLUMNS]]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from lsst.dax.metaserv.schema_utils import parse_schema
+
+from synthetic_ddl import write_ddl
+
+# The reference implementation lives with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "tests"))
+from schema_regex_parser import parse_schema_regex
+
+
+def retained(parse, path):
+    """Return the bytes held by the result of parse, and the peak bytes
+    allocated while parsing."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        schema = parse(path)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del schema
+    return current, peak
+
+
+def main(n_tables, n_columns):
+    fd, path = tempfile.mkstemp(suffix=".sql")
+    os.close(fd)
+    try:
+        write_ddl(path, n_tables, n_columns)
+        print("%d tables x %d columns" % (n_tables, n_columns))
+        print("%8s %14s %14s" % ("", "held (MB)", "peak (MB)"))
+        results = {}
+        for name, parse in (("dicts", parse_schema_regex),
+                            ("records", parse_schema)):
+            results[name] = retained(parse, path)
+            print("%8s %14.2f %14.2f" % (name, results[name][0] / 1e6,
+                                         results[name][1] / 1e6))
+        print("held: %.0f%% of the dicts" %
+              (100.0 * results["records"][0] / results["dicts"][0]))
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [1000, 100][len(args):]))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Benchmark suite of the schema parser on synthetic DDL (see
+synthetic_ddl.py), from a few hundred to 300,000 columns.
+
+For each case and parser front end, it measures the throughput (best
+of REPEAT runs) and the peak memory allocated while parsing (with
+tracemalloc, in a separate run). Results are printed, and appended as
+JSON lines to a results file, tagged with the git commit, so runs of
+different commits can be compared:
+
+    bench_parser_suite.py                  # default cases
+    bench_parser_suite.py -c huge          # 2000 tables x 150 columns
+    bench_parser_suite.py --compare abc123 # against a former run
+
+The comparison uses the last recorded run of the given commit (or of
+the previous commit with results, with "last").
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from lsst.dax.metaserv.schema_utils import parse_schema, parse_schema_mmap
+
+from synthetic_ddl import write_ddl
+
+#: name: (tables, columns per table, lines per <descr> block)
+CASES = {
+    "small": (10, 20, 2),
+    "medium": (200, 50, 3),
+    "large": (1000, 100, 3),
+    "huge": (2000, 150, 3),
+}
+DEFAULT_CASES = ["small", "medium", "large"]
+
+FRONT_ENDS = {
+    "file": parse_schema,
+    "mmap": parse_schema_mmap,
+}
+
+REPEAT = 3
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "results", "parse_schema.jsonl")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_memory(parse, path):
+    tracemalloc.start()
+    try:
+        parse(path)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name, path, repeat):
+    n_tables, n_columns, descr_lines = CASES[name]
+    n_lines = write_ddl(path, n_tables, n_columns, descr_lines=descr_lines)
+    size = os.path.getsize(path)
+    results = []
+    for front_end, parse in sorted(FRONT_ENDS.items()):
+        elapsed = min(timeit.repeat(lambda: parse(path), number=1,
+                                    repeat=repeat))
+        results.append({
+            "case": name,
+            "front_end": front_end,
+            "tables": n_tables,
+            "columns": n_tables * n_columns,
+            "lines": n_lines,
+            "bytes": size,
+            "seconds": round(elapsed, 6),
+            "lines_per_s": round(n_lines / elapsed),
+            "mb_per_s": round(size / elapsed / 1e6, 3),
+            "peak_bytes": peak_memory(parse, path),
+        })
+    return results
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as results:
+        return [json.loads(line) for line in results if line.strip()]
+
+
+def select_baseline(records, ref, commit):
+    """Return the records of the last run of a commit, by prefix, or of
+    the last run of another commit if ref is "last"."""
+    runs = [r for r in records
+            if (r["commit"] != commit if ref == "last"
+                else r["commit"].startswith(ref))]
+    if not runs:
+        return {}
+    last_run = runs[-1]["run"]
+    return {(r["case"], r["front_end"]): r for r in runs
+            if r["run"] == last_run}
+
+
+def print_results(results, baseline):
+    print("%-8s %-5s %8s %9s %10s %12s %10s %8s %8s" % (
+        "case", "front", "columns", "lines", "time (ms)", "lines/s",
+        "peak (MB)", "time", "peak"))
+    for r in results:
+        base = baseline.get((r["case"], r["front_end"]))
+        delta = ("%+7.1f%% %+7.1f%%" % (
+            (r["seconds"] / base["seconds"] - 1) * 100,
+            (r["peak_bytes"] / base["peak_bytes"] - 1) * 100)
+            if base else "")
+        print("%-8s %-5s %8d %9d %10.1f %12d %10.2f %s" % (
+            r["case"], r["front_end"], r["columns"], r["lines"],
+            r["seconds"] * 1000, r["lines_per_s"], r["peak_bytes"] / 1e6,
+            delta))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-c", "--case", action="append",
+                        choices=sorted(CASES),
+                        help="Case to run, may be repeated")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT)
+    parser.add_argument("-o", "--results", default=RESULTS,
+                        help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", metavar="COMMIT",
+                        help='Commit (prefix) to compare with, or "last"')
+    parser.add_argument("--no-save", action="store_true",
+                        help="Do not record the results")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    run = {"run": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+           "commit": commit,
+           "python": platform.python_version(),
+           "machine": platform.node()}
+    fd, path = tempfile.mkstemp(suffix=".sql")
+    os.close(fd)
+    results = []
+    try:
+        for name in args.case or DEFAULT_CASES:
+            for result in run_case(name, path, args.repeat):
+                result.update(run)
+                results.append(result)
+    finally:
+        os.remove(path)
+
+    baseline = {}
+    if args.compare:
+        baseline = select_baseline(load_results(args.results),
+                                   args.compare, commit)
+        if not baseline:
+            print("No recorded run for '%s'" % args.compare)
+    print("commit %s, python %s" % (commit, run["python"]))
+    print_results(results, baseline)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)),
+                    exist_ok=True)
+        with open(args.results, "a") as out:
+            for result in results:
+                out.write(json.dumps(result, sort_keys=True) + "\n")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
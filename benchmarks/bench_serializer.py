@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Microbenchmark of the serialization of a table listing: marshmallow
+``Schema.dump`` against ``api_model.CompiledSchema``. No database is
+involved, the rows are snapshot entries.
+
+Usage: bench_serializer.py [N_TABLES [N_COLUMNS]]
+"""
+
+import json
+import sys
+import timeit
+
+from flask import Flask, request
+
+from lsst.dax.metaserv import api_v1
+from lsst.dax.metaserv.api_model import DatabaseTable, compiled_schema
+from lsst.dax.metaserv.snapshot import DatabaseEntry, TableEntry, \
+    ColumnEntry
+
+REPEAT = 5
+
+
+def make_tables(n_tables, n_columns):
+    tables = []
+    column_id = 0
+    for i in range(n_tables):
+        table = TableEntry(i, 1, "Table%d" % i, "Description of table %d" % i)
+        for j in range(n_columns):
+            column_id += 1
+            table.columns.append(ColumnEntry(
+                column_id, i, "column%d" % j, "Description of column %d" % j,
+                j, "pos.eq.ra", "deg", "double", True, None))
+        tables.append(table)
+    return tables
+
+
+def main(n_tables, n_columns):
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.metaserv_api_v1, url_prefix='/meta/v1')
+    tables = make_tables(n_tables, n_columns)
+    with app.test_request_context("/meta/v1/db/db/tables/"):
+        request.database = DatabaseEntry(1, "db", None, "localhost", 3306)
+
+        def marshmallow_dump():
+            return DatabaseTable(many=True).dump(tables).data
+
+        def compiled_dump():
+            return compiled_schema(DatabaseTable).dump(tables, many=True)
+
+        assert json.dumps(marshmallow_dump()) == json.dumps(compiled_dump())
+        print("%d tables x %d columns" % (n_tables, n_columns))
+        for name, dump in (("marshmallow", marshmallow_dump),
+                           ("compiled", compiled_dump)):
+            elapsed = min(timeit.repeat(dump, number=1, repeat=REPEAT))
+            print("%12s %10.2f ms" % (name, elapsed * 1000))
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [200, 50][len(args):]))
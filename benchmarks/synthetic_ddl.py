@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Generator of synthetic DDL in the dialect understood by
+schema_utils.parse_schema: tables with <descr> blocks spanning several
+lines (some with yaml-style blank lines), UCDs, units, DEFAULT values,
+sized types and indexes. The output only depends on the arguments and
+the seed.
+
+Usage: synthetic_ddl.py N_TABLES N_COLUMNS [OUTPUT]
+"""
+
+import random
+import sys
+
+#: (DDL type, whether it takes a size)
+DATATYPES = [("BIGINT", False), ("INTEGER", False), ("TINYINT", False),
+             ("DOUBLE", False), ("FLOAT", False), ("BIT(1)", False),
+             ("CHAR", True), ("VARCHAR", True), ("TIMESTAMP", False),
+             ("BINARY", True)]
+UCDS = ["pos.eq.ra;meta.main", "pos.eq.dec;meta.main", "meta.id;src",
+        "phot.flux;em.opt.r", "stat.error;phot.flux", "time.epoch"]
+UNITS = ["deg", "arcsec", "nmgy", "mag", "d", "pixel"]
+WORDS = ["flux", "measured", "of", "the", "source", "in", "band", "with",
+         "error", "position", "centroid", "model", "aperture", "PSF"]
+
+
+def generate_ddl(out, n_tables, n_columns, descr_lines=2, ucd_ratio=0.5,
+                 unit_ratio=0.5, n_indexes=2, seed=0):
+    """Write synthetic DDL to a file-like object.
+
+    :param out: Object with a write method
+    :param n_tables: Number of tables
+    :param n_columns: Number of columns per table
+    :param descr_lines: Number of lines of each column <descr> block
+    :param ucd_ratio: Fraction of the columns with a UCD
+    :param unit_ratio: Fraction of the columns with a unit
+    :param n_indexes: Number of indexes per table, besides the primary key
+    :param seed: Seed of the random choices
+    :returns: The number of lines written
+    """
+    rng = random.Random(seed)
+    lines = 0
+
+    def sentence(n_words):
+        return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+    for i in range(n_tables):
+        out.write("CREATE TABLE Table%d\n"
+                  "    -- <descr>%s.</descr>\n"
+                  "(\n" % (i, sentence(8)))
+        lines += 3
+        for j in range(n_columns):
+            datatype, sized = rng.choice(DATATYPES)
+            if sized:
+                datatype += "(%d)" % rng.randint(1, 255)
+            default = " DEFAULT %d" % rng.randint(0, 9) \
+                if rng.random() < 0.2 else ""
+            not_null = " NOT NULL" if rng.random() < 0.5 else ""
+            out.write("    column%d %s%s%s,\n" % (j, datatype, not_null,
+                                                  default))
+            lines += 1
+            if descr_lines == 1:
+                out.write("        -- <descr>%s.</descr>\n" % sentence(10))
+                lines += 1
+            elif descr_lines > 1:
+                out.write("        -- <descr>%s\n" % sentence(10))
+                for k in range(descr_lines - 2):
+                    if rng.random() < 0.1:
+                        # yaml-style paragraph break
+                        out.write("        --\n")
+                    else:
+                        out.write("        -- %s\n" % sentence(10))
+                out.write("        -- %s.</descr>\n" % sentence(6))
+                lines += descr_lines
+            if rng.random() < ucd_ratio:
+                out.write("        -- <ucd>%s</ucd>\n" % rng.choice(UCDS))
+                lines += 1
+            if rng.random() < unit_ratio:
+                out.write("        -- <unit>%s</unit>\n" % rng.choice(UNITS))
+                lines += 1
+        out.write("    PRIMARY KEY (column0)")
+        for k in range(min(n_indexes, n_columns)):
+            kind = "UNIQUE" if k % 3 == 2 else rng.choice(["INDEX", "KEY"])
+            out.write(",\n    %s IDX_Table%d_%d (column%d%s)" % (
+                kind, i, k, k, rng.choice(["", " ASC", " DESC"])))
+        out.write("\n) ENGINE=MyISAM;\n\n")
+        lines += min(n_indexes, n_columns) + 3
+    return lines
+
+
+def write_ddl(path, *args, **kwargs):
+    """generate_ddl to a file, see generate_ddl."""
+    with open(path, "w") as out:
+        return generate_ddl(out, *args, **kwargs)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4:
+        write_ddl(sys.argv[3], int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        generate_ddl(sys.stdout, int(sys.argv[1]), int(sys.argv[2]))
@@ -33,13 +33,13 @@ import json
 import logging as log
 import sys
 from lsst.dax.metaserv import api_v0, api_v1
-from lsst.db.engineFactory import getEngineFromFile
+from lsst.dax.metaserv.pool import get_pooled_engine
 
 app = Flask(__name__)
 
-# Configure Engine
+# Configure Engine, pool options are read from its [pool] section
 defaults_file = "~/.lsst/metaserv.ini"
-engine = getEngineFromFile(defaults_file)
+engine = get_pooled_engine(defaults_file)
 app.config["default_engine"] = engine
 
 
@@ -27,16 +27,27 @@ information into the LSST Metadata Server.
 @author  Jacek Becla, SLAC
 """
 
+import json
 import logging as log
 import click
 import os
+import time
+from collections import namedtuple
 
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from lsst.db.engineFactory import getEngineFromFile
 from lsst.db.exception import produceExceptionClass
-from .schema_utils import parse_schema
+from .schema_utils import parse_schema, parse_schemas, schema_as_dicts, \
+    SchemaParseError, MYSQL_TYPE_MAP
+from .parse_cache import ParseCache
+from .pool import get_pooled_engine
 from .model import MSUser, MSRepo, MSDatabase, MSDatabaseSchema, \
-    MSDatabaseTable, MSDatabaseColumn
+    MSDatabaseTable, MSDatabaseColumn, bump_generation
 
 MetaBException = produceExceptionClass('MetaBException', [
     (3005, "BAD_CMD",           "Bad command, see HELP for details."),
@@ -56,7 +67,8 @@ MetaBException = produceExceptionClass('MetaBException', [
 
 class CliConfig(object):
     def __init__(self, config_path):
-        self.engine = getEngineFromFile(config_path)
+        # Honors the [pool] section of the config file
+        self.engine = get_pooled_engine(config_path)
 
 
 pass_config = click.make_pass_decorator(CliConfig)
@@ -69,10 +81,14 @@ pass_config = click.make_pass_decorator(CliConfig)
               type=click.Path())
 @click.option('--verbose', '-v', is_flag=True,
               help='Enables verbose mode.')
+@click.option('parse_cache', '--parse-cache', envvar='MS_PARSE_CACHE',
+              default=None, type=click.Path(file_okay=False),
+              help='Directory caching parsed schema files.')
 @click.pass_context
-def cli(ctx, config, verbose):
+def cli(ctx, config, verbose, parse_cache):
     ctx.obj = CliConfig(config)
     ctx.obj.verbose = verbose
+    ctx.obj.parse_cache = ParseCache(parse_cache) if parse_cache else None
     ctx.obj.Session = sessionmaker(ctx.obj.engine)
     ctx.obj.log = log.getLogger("lsst.metaserv.admin")
 
@@ -85,17 +101,26 @@ def init_db(config):
 
 
 def _init_db(config):
-    from .model import Base
-    Base.metadata.create_all(config.engine, checkfirst=True)
+    from .model import init_db
+    init_db(config.engine)
+
+
+@cli.command("upgrade-db")
+@pass_config
+def upgrade_db(config):
+    """Add the tables, indexes and rows missing from a store created by
+    an older version, keeping its content."""
+    from .model import upgrade_db
+    for name in upgrade_db(config.engine):
+        click.echo("Created index %s" % name)
 
 
 @cli.command("reinit-db")
 @pass_config
 def reinit_db(config):
     """Drops the database and reinitializes it."""
-    from .model import Base
-    Base.metadata.drop_all(config.engine)
-    _init_db(config)
+    from .model import _reinit_db
+    _reinit_db(config.engine)
 
 
 @cli.command("add-db")
@@ -138,14 +163,17 @@ def add_db(config, schema_file, db_name, host, port, schema_name,
 
     :param data_release: Associated Data Release
 
-    :param target_engine: If provided , this engine will be used to
-    check that metadata will be consistent with what's loaded
-    in the target_engine's database.
+    :param target_engine: If provided, this engine (or SQLAlchemy URL)
+    will be used to check that metadata will be consistent with what's
+    loaded in the target_engine's database.
 
     """
 
     # Parse the ascii schema file
-    parsed_schema = parse_schema(schema_file)
+    try:
+        parsed_schema = parse_schema(schema_file, config.parse_cache)
+    except (IOError, SchemaParseError) as e:
+        raise click.ClickException(str(e))
 
     if target_engine:
         _check_schema_consistency(config, db_name, schema_name, parsed_schema,
@@ -155,7 +183,22 @@ def add_db(config, schema_file, db_name, host, port, schema_name,
     # Now, we will be talking to the metaserv database, so change
     # connection as needed
     session = config.Session()
+    try:
+        return _ingest(config, session, parsed_schema, db_name, host, port,
+                       schema_name, schema_description, owner, lsst_level,
+                       data_release)
+    except Exception as e:
+        print(e)
+        raise e
+    finally:
+        session.close()
 
+
+def _ingest(config, session, parsed_schema, db_name, host, port,
+            schema_name, schema_description, owner, lsst_level=None,
+            data_release=None):
+    """Register a database and its parsed schema in one transaction,
+    which is rolled back on error."""
     user = session.query(MSUser).filter(MSUser.email == owner).scalar()
     ops = Operations()
     if not user:
@@ -168,14 +211,222 @@ def add_db(config, schema_file, db_name, host, port, schema_name,
         db = ops.add_database(session, repo, db_name, host, port)
         schema = ops.add_schema(session, db, schema_name)
         ops.add_tables_and_columns(session, schema, parsed_schema)
+        bump_generation(session)
         session.commit()
-    except Exception as e:
-        print(e)
+    except Exception:
         session.rollback()
-        raise e
+        raise
+    return db
+
+
+#: Keys of the manifest entries of add-dbs, see _read_manifest
+MANIFEST_KEYS = ("schema_file", "db_name", "host", "port", "schema_name",
+                 "schema_version", "schema_description", "owner",
+                 "lsst_level", "data_release")
+MANIFEST_REQUIRED_KEYS = MANIFEST_KEYS[:8]
+
+
+def _read_manifest(manifest_path):
+    """Read the databases listed in an add-dbs manifest.
+
+    The manifest is a JSON or, if PyYAML is installed, YAML (.yaml,
+    .yml) document::
+
+        defaults:              # optional, shared by every entry
+          host: lsst-db
+          port: 3306
+          owner: user@lsst.org
+        databases:
+          - schema_file: dr1/Object.sql   # relative to the manifest
+            db_name: DR1_Object
+            schema_name: DR1_Object
+            schema_version: "1.0"
+            schema_description: Objects of DR1
+          - ...
+
+    Entries take the keys of MANIFEST_KEYS, the arguments of add-db. A
+    bare list of entries is accepted as well.
+
+    :returns: The list of entries, as dicts with the defaults applied
+    """
+    with open(manifest_path) as manifest_file:
+        if manifest_path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise click.ClickException(
+                    "PyYAML is needed to read '%s'" % manifest_path)
+            manifest = yaml.safe_load(manifest_file)
+        else:
+            manifest = json.load(manifest_file)
+    if isinstance(manifest, list):
+        manifest = {"databases": manifest}
+    defaults = manifest.get("defaults") or {}
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    for number, database in enumerate(manifest.get("databases") or [], 1):
+        entry = dict(defaults)
+        entry.update(database)
+        unknown = set(entry) - set(MANIFEST_KEYS)
+        missing = [key for key in MANIFEST_REQUIRED_KEYS if key not in entry]
+        if unknown or missing:
+            raise click.ClickException(
+                "Manifest entry %d: unknown keys %s, missing keys %s" %
+                (number, sorted(unknown), missing))
+        entry["schema_file"] = os.path.join(base_dir, entry["schema_file"])
+        entries.append(entry)
+    return entries
+
+
+@cli.command("add-dbs")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Number of parsing processes, one per CPU by default.")
+@pass_config
+def add_dbs(config, manifest, jobs):
+    """Add the databases listed in a manifest (see _read_manifest).
+
+    Schema files are parsed concurrently, then each database is
+    registered in its own transaction, over the engine of the config
+    file. A database which fails does not stop the others; the command
+    prints a summary and exits with status 1 if any failed.
+    """
+    entries = _read_manifest(manifest)
+    start = time.time()
+    parsed = parse_schemas([entry["schema_file"] for entry in entries],
+                           max_workers=jobs, cache=config.parse_cache)
+    config.log.info("Parsed %d schema files in %.2f s", len(entries),
+                    time.time() - start)
+
+    failed = 0
+    session = config.Session()
+    try:
+        for entry, result in zip(entries, parsed):
+            db_name = entry["db_name"]
+            if result.error is not None:
+                failed += 1
+                click.echo("%s: FAILED parsing: %s" % (db_name, result.error))
+                continue
+            entry_start = time.time()
+            try:
+                _ingest(config, session, result.schema, db_name,
+                        entry["host"], entry["port"], entry["schema_name"],
+                        entry["schema_description"], entry["owner"],
+                        entry.get("lsst_level"), entry.get("data_release"))
+            except Exception as e:
+                failed += 1
+                click.echo("%s: FAILED: %s" % (db_name, e))
+                continue
+            n_columns = sum(len(table.get("columns", ()))
+                            for table in result.schema.values())
+            click.echo("%s: added %d tables, %d columns in %.2f s" % (
+                db_name, len(result.schema), n_columns,
+                time.time() - entry_start))
     finally:
         session.close()
-    return db
+    click.echo("%d databases added, %d failed, in %.2f s" % (
+        len(entries) - failed, failed, time.time() - start))
+    if failed:
+        raise click.exceptions.Exit(1)
+
+
+@cli.command("update-db")
+@click.argument("schema_file")
+@click.argument("db_name")
+@click.argument("schema_name", required=False)
+@click.option("--dry-run", "-n", is_flag=True,
+              help="Report the changes and roll them back.")
+@pass_config
+def update_db(config, schema_file, db_name, schema_name, dry_run):
+    """Update the tables and columns of a database from its schema file.
+
+    Only what differs from the stored metadata is inserted, updated or
+    deleted, in one transaction, which bumps the generation if anything
+    changed.
+
+    :param schema_file: ascii file containing schema with
+    description.
+
+    :param db_name: database name
+
+    :param schema_name: name of the schema to update, the default schema
+    of the database if omitted.
+    """
+    try:
+        parsed_schema = parse_schema(schema_file, config.parse_cache)
+    except (IOError, SchemaParseError) as e:
+        raise click.ClickException(str(e))
+
+    session = config.Session()
+    try:
+        db = session.query(MSDatabase).filter(
+            MSDatabase.name == db_name).scalar()
+        if not db:
+            config.log.error("Database '%s' not found.", db_name)
+            raise MetaBException(MetaBException.DB_DOES_NOT_EXIST, db_name)
+        if schema_name:
+            schema = db.schemas.filter(
+                MSDatabaseSchema.name == schema_name).scalar()
+        else:
+            schema = db.default_schema
+        if not schema:
+            raise click.ClickException("Schema '%s' of '%s' not found." % (
+                schema_name or "(default)", db_name))
+        schema_name = schema.name
+        counts = Operations.update_tables_and_columns(session, schema,
+                                                      parsed_schema)
+        changed = any(counts.values())
+        if changed and not dry_run:
+            bump_generation(session)
+            session.commit()
+        else:
+            session.rollback()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    click.echo("%s%s.%s: tables %d added, %d updated, %d deleted; "
+               "columns %d added, %d updated, %d deleted" % (
+                   "(dry run) " if dry_run else "", db_name, schema_name,
+                   counts["tables_added"], counts["tables_updated"],
+                   counts["tables_deleted"], counts["columns_added"],
+                   counts["columns_updated"], counts["columns_deleted"]))
+    return counts
+
+
+@cli.command("parse-schemas")
+@click.argument("schema_files", nargs=-1, required=True,
+                type=click.Path())
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Number of parsing processes, one per CPU by default.")
+@click.option("--json", "as_json", is_flag=True,
+              help="Print the parsed schemas as JSON.")
+@pass_config
+def parse_schemas_cmd(config, schema_files, jobs, as_json):
+    """Parse schema files concurrently and report on each of them.
+
+    Exits with status 1 if any of the files could not be parsed.
+    """
+    results = parse_schemas(schema_files, max_workers=jobs,
+                            cache=config.parse_cache)
+    failed = [result for result in results if result.error is not None]
+    if as_json:
+        click.echo(json.dumps(
+            [{"path": result.path,
+              "schema": result.schema and schema_as_dicts(result.schema),
+              "error": None if result.error is None else str(result.error)}
+             for result in results], indent=2))
+    else:
+        for result in results:
+            if result.error is not None:
+                click.echo("%s: error: %s" % (result.path, result.error),
+                           err=True)
+            else:
+                n_columns = sum(len(table.get("columns", ()))
+                                for table in result.schema.values())
+                click.echo("%s: %d tables, %d columns" %
+                           (result.path, len(result.schema), n_columns))
+    if failed:
+        raise click.exceptions.Exit(1)
 
 
 @cli.command("add-user")
@@ -234,77 +485,331 @@ class Operations:
         session.flush()
         return schema
 
+    #: Number of rows per executemany in add_tables_and_columns, and of
+    #: ids per DELETE in update_tables_and_columns
+    BULK_BATCH_SIZE = 5000
+
+    #: Attributes of MSDatabaseColumn compared by update_tables_and_columns
+    COLUMN_FIELDS = ("description", "ordinal", "ucd", "unit", "nullable",
+                     "datatype", "arraysize")
+
+    @staticmethod
+    def _column_mapping(table_id, ord_pos, col):
+        return {
+            "table_id": table_id,
+            "name": col["name"],
+            "description": col.get("description", ""),
+            "ordinal": ord_pos,
+            "ucd": col.get("ucd", ""),
+            "unit": col.get("unit", ""),
+            "nullable": col.get("nullable", True),
+            "datatype": col.get("datatype", ""),
+            "arraysize": col.get("arraysize", ""),
+        }
+
+    @staticmethod
+    def _insert_columns(session, mappings):
+        """Insert column mappings in batches of BULK_BATCH_SIZE.
+
+        :returns: The number of columns inserted
+        """
+        logger = log.getLogger("lsst.metaserv.admin")
+        inserted = 0
+        batch = []
+        for mapping in mappings:
+            batch.append(mapping)
+            if len(batch) == Operations.BULK_BATCH_SIZE:
+                session.bulk_insert_mappings(MSDatabaseColumn, batch,
+                                             render_nulls=True)
+                inserted += len(batch)
+                batch = []
+                logger.info("Inserted %d columns", inserted)
+        if batch:
+            session.bulk_insert_mappings(MSDatabaseColumn, batch,
+                                         render_nulls=True)
+            inserted += len(batch)
+        return inserted
+
+    @staticmethod
+    def _delete_by_ids(session, column, ids):
+        """Delete the rows of column's table whose column is in ids."""
+        ids = list(ids)
+        for i in range(0, len(ids), Operations.BULK_BATCH_SIZE):
+            session.query(column.class_).filter(
+                column.in_(ids[i:i + Operations.BULK_BATCH_SIZE])).delete(
+                    synchronize_session=False)
+
+    @staticmethod
+    def _table_ids(session, schema):
+        return dict(session.query(
+            MSDatabaseTable.name, MSDatabaseTable.id).filter(
+                MSDatabaseTable.schema_id == schema.id))
+
     @staticmethod
     def add_tables_and_columns(session, schema, parsed_schema):
-        for table_name in parsed_schema:
-            table_data = parsed_schema[table_name]
-
-            table = MSDatabaseTable(
-                name=table_name,
-                schema_id=schema.id,
-                description=table_data.get("description", "")
-            )
-            session.add(table)
-            session.flush()
-            columns = table_data["columns"]
-            for col, ord_pos in zip(columns, range(len(columns))):
-                print(col)
-                column = MSDatabaseColumn(
-                    table_id=table.id,
-                    name=col["name"],
-                    description=col.get("description", ""),
-                    ordinal=ord_pos,
-                    ucd=col.get("ucd", ""),
-                    unit=col.get("unit", ""),
-                    nullable=col.get("nullable", True),
-                    datatype=col.get("datatype", ""),
-                    arraysize=col.get("arraysize", ""),
-                )
-                session.add(column)
-            session.flush()
+        """Insert the tables of a parsed schema and their columns.
+
+        Rows are inserted in bulk (executemany), without ORM objects:
+        one batch of tables, one query for the ids of the new tables,
+        then batches of columns. None values are sent as NULL
+        (render_nulls), otherwise every combination of missing values
+        would be a separate statement.
+        """
+        logger = log.getLogger("lsst.metaserv.admin")
+        session.bulk_insert_mappings(MSDatabaseTable, [
+            {"name": table_name,
+             "schema_id": schema.id,
+             "description": table_data.get("description", "")}
+            for table_name, table_data in parsed_schema.items()])
+        table_ids = Operations._table_ids(session, schema)
+        logger.info("Inserted %d tables in schema '%s'", len(parsed_schema),
+                    schema.name)
+
+        inserted = Operations._insert_columns(session, (
+            Operations._column_mapping(table_ids[table_name], ord_pos, col)
+            for table_name, table_data in parsed_schema.items()
+            for ord_pos, col in enumerate(table_data["columns"])))
+        logger.info("Inserted %d columns in schema '%s'", inserted,
+                    schema.name)
+
+    @staticmethod
+    def update_tables_and_columns(session, schema, parsed_schema):
+        """Bring the stored tables and columns of a schema in line with
+        a parsed schema, touching only what differs.
+
+        The stored rows are read with two queries and indexed by name;
+        tables and columns are then matched by name. New ones are
+        inserted, and those no longer in the parsed schema deleted, in
+        bulk; changed ones are updated in bulk, by id. Ids of unchanged
+        and updated rows are kept. Nothing is committed.
+
+        :returns: A dict of counts: tables_added, tables_updated,
+        tables_deleted, columns_added, columns_updated, columns_deleted
+        """
+        logger = log.getLogger("lsst.metaserv.admin")
+        stored_tables = {name: (table_id, description) for
+                         table_id, name, description in session.query(
+                             MSDatabaseTable.id, MSDatabaseTable.name,
+                             MSDatabaseTable.description).filter(
+                                 MSDatabaseTable.schema_id == schema.id)}
+        stored_columns = {}
+        fields = [getattr(MSDatabaseColumn, field)
+                  for field in Operations.COLUMN_FIELDS]
+        for row in session.query(
+                MSDatabaseColumn.id, MSDatabaseColumn.table_id,
+                MSDatabaseColumn.name, *fields).join(
+                    MSDatabaseTable,
+                    MSDatabaseTable.id == MSDatabaseColumn.table_id).filter(
+                        MSDatabaseTable.schema_id == schema.id):
+            stored_columns.setdefault(row[1], {})[row[2]] = row
+
+        def same(stored, parsed):
+            # add_tables_and_columns stores missing values as "", which
+            # may read back as NULL
+            return (None if stored == "" else stored) == \
+                (None if parsed == "" else parsed)
+
+        counts = dict.fromkeys(("tables_added", "tables_updated",
+                                "tables_deleted", "columns_added",
+                                "columns_updated", "columns_deleted"), 0)
+
+        # Tables
+        new_tables = [name for name in parsed_schema
+                      if name not in stored_tables]
+        deleted_ids = [table_id for name, (table_id, _) in
+                       stored_tables.items() if name not in parsed_schema]
+        table_updates = [
+            {"id": stored_tables[name][0],
+             "description": table_data.get("description", "")}
+            for name, table_data in parsed_schema.items()
+            if name in stored_tables and not same(
+                stored_tables[name][1], table_data.get("description", ""))]
+        if deleted_ids:
+            Operations._delete_by_ids(session, MSDatabaseColumn.table_id,
+                                      deleted_ids)
+            Operations._delete_by_ids(session, MSDatabaseTable.id,
+                                      deleted_ids)
+            # Forget their columns, as the ids of the deleted tables may
+            # be reused by the new ones
+            counts["columns_deleted"] += sum(
+                len(stored_columns.pop(table_id, ()))
+                for table_id in deleted_ids)
+        if table_updates:
+            session.bulk_update_mappings(MSDatabaseTable, table_updates)
+        if new_tables:
+            session.bulk_insert_mappings(MSDatabaseTable, [
+                {"name": name,
+                 "schema_id": schema.id,
+                 "description": parsed_schema[name].get("description", "")}
+                for name in new_tables])
+        counts["tables_added"] = len(new_tables)
+        counts["tables_updated"] = len(table_updates)
+        counts["tables_deleted"] = len(deleted_ids)
+        table_ids = (Operations._table_ids(session, schema) if new_tables
+                     else {name: table_id for name, (table_id, _) in
+                           stored_tables.items()})
+
+        # Columns
+        column_inserts = []
+        column_updates = []
+        deleted_ids = []
+        for table_name, table_data in parsed_schema.items():
+            table_id = table_ids[table_name]
+            stored = stored_columns.get(table_id, {})
+            names = set()
+            for ord_pos, col in enumerate(table_data["columns"]):
+                mapping = Operations._column_mapping(table_id, ord_pos, col)
+                names.add(mapping["name"])
+                row = stored.get(mapping["name"])
+                if row is None:
+                    column_inserts.append(mapping)
+                elif not all(same(value, mapping[field]) for field, value in
+                             zip(Operations.COLUMN_FIELDS, row[3:])):
+                    del mapping["table_id"]
+                    mapping["id"] = row[0]
+                    column_updates.append(mapping)
+            deleted_ids.extend(row[0] for name, row in stored.items()
+                               if name not in names)
+        Operations._delete_by_ids(session, MSDatabaseColumn.id, deleted_ids)
+        if column_updates:
+            session.bulk_update_mappings(MSDatabaseColumn, column_updates)
+        counts["columns_added"] += Operations._insert_columns(
+            session, column_inserts)
+        counts["columns_updated"] += len(column_updates)
+        counts["columns_deleted"] += len(deleted_ids)
+        logger.info("Updated schema '%s': %s", schema.name, counts)
+        return counts
+
+
+#: Differences between a parsed schema and the catalog of the database
+#: server, see _diff_schema. Items are table names, (table, column)
+#: pairs, and (table, column, parsed type, catalog type) for mismatches.
+SchemaDiff = namedtuple("SchemaDiff", ["missing_tables", "extra_tables",
+                                       "missing_columns", "extra_columns",
+                                       "type_mismatches"])
+
+# information_schema.COLUMNS.DATA_TYPE values the DDL spells differently
+_CATALOG_TYPE_ALIASES = {"INT": "INTEGER"}
+# Datatypes whose arraysize is a length, CHARACTER_MAXIMUM_LENGTH in
+# the catalog. For the others, it is a display width or precision, which
+# the catalog does not report there.
+_SIZED_DATATYPES = frozenset(["text", "binary"])
+
+
+def _catalog_type(data_type, length):
+    """Return the parsed datatype and arraysize corresponding to a
+    data type and character length of information_schema.COLUMNS."""
+    data_type = data_type.upper()
+    data_type = _CATALOG_TYPE_ALIASES.get(data_type, data_type)
+    datatype = MYSQL_TYPE_MAP.get(data_type, data_type.lower())
+    if datatype == "boolean":
+        length = None
+    return datatype, length
+
+
+def _catalog_columns(target_engine, schema_name):
+    """Read the columns of all the tables of a schema, with one query on
+    information_schema.COLUMNS.
+
+    :returns: {table name: {column name: (datatype, arraysize)}}, the
+    types as the schema parser reports them (see _catalog_type)
+    """
+    catalog = {}
+    rows = target_engine.execute(text(
+        "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH "
+        "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :schema "
+        "ORDER BY TABLE_NAME, ORDINAL_POSITION"), schema=schema_name)
+    for table_name, column_name, data_type, length in rows:
+        catalog.setdefault(table_name, {})[column_name] = _catalog_type(
+            data_type, length)
+    return catalog
+
+
+def _diff_schema(parsed_schema, catalog):
+    """Compare a parsed schema with the catalog of its database.
+
+    :param catalog: As returned by _catalog_columns
+    :returns: A SchemaDiff. The arraysize of a parsed column is only
+    compared for character and binary types, and if the DDL gives one.
+    """
+    diff = SchemaDiff([], sorted(set(catalog) - set(parsed_schema)),
+                      [], [], [])
+    for table_name, parsed_table in parsed_schema.items():
+        db_columns = catalog.get(table_name)
+        if db_columns is None:
+            diff.missing_tables.append(table_name)
+            continue
+        parsed_names = set()
+        for column in parsed_table["columns"]:
+            column_name = column["name"]
+            parsed_names.add(column_name)
+            db_type = db_columns.get(column_name)
+            if db_type is None:
+                diff.missing_columns.append((table_name, column_name))
+                continue
+            arraysize = column.get("arraysize")
+            parsed_type = (column["datatype"], arraysize)
+            if parsed_type[0] != db_type[0] or \
+                    parsed_type[0] in _SIZED_DATATYPES and \
+                    arraysize is not None and arraysize != db_type[1]:
+                diff.type_mismatches.append(
+                    (table_name, column_name, parsed_type, db_type))
+        diff.extra_columns.extend((table_name, column_name)
+                                  for column_name in db_columns
+                                  if column_name not in parsed_names)
+    return diff
+
+
+def _format_schema_diff(diff):
+    """Return the lines of a report of a SchemaDiff."""
+    def type_name(datatype_arraysize):
+        datatype, arraysize = datatype_arraysize
+        return datatype if arraysize is None else \
+            "%s(%s)" % (datatype, arraysize)
+
+    lines = ["Table '%s' not found in db, present in ascii file" % table
+             for table in diff.missing_tables]
+    lines.extend("Table '%s' found in db only" % table
+                 for table in diff.extra_tables)
+    lines.extend("Column '%s.%s' not found in db, present in ascii file" %
+                 column for column in diff.missing_columns)
+    lines.extend("Column '%s.%s' not found in ascii file, present in db" %
+                 column for column in diff.extra_columns)
+    lines.extend("Column '%s.%s' is %s in ascii file, %s in db" % (
+        table, column, type_name(parsed_type), type_name(db_type))
+        for table, column, parsed_type, db_type in diff.type_mismatches)
+    return lines
 
 
 def _check_schema_consistency(config, db_name, schema_name, parsed_schema,
                               schema_version, schema_description,
                               target_engine):
-    # Connect to the server that has database that is being added
-    from sqlalchemy.engine.reflection import Inspector
+    """Check a parsed schema against the database being added.
 
-    inspector = Inspector(target_engine)
-
-    if schema_name not in inspector.get_schema_names():
-        config.log.error("Schema '%s' not found.", db_name)
+    All differences are logged before raising. Tables of the database
+    which are not in the parsed schema are allowed.
+    """
+    # Connect to the server that has database that is being added
+    if not hasattr(target_engine, "execute"):
+        target_engine = create_engine(target_engine)
+
+    catalog = _catalog_columns(target_engine, schema_name)
+    if not catalog and not target_engine.execute(text(
+            "SELECT COUNT(*) FROM information_schema.SCHEMATA "
+            "WHERE SCHEMA_NAME = :schema"), schema=schema_name).scalar():
+        config.log.error("Schema '%s' not found.", schema_name)
         raise MetaBException(MetaBException.DB_DOES_NOT_EXIST, db_name)
 
-    db_tables = inspector.get_table_names(schema=schema_name)
-
-    for table_name, parsed_table in parsed_schema.items():
-        # Check parsed tables - we allow other tables in schema
-        if table_name not in db_tables:
-            config.log.error(
-                "Table '%s' not found in db, present in ascii file.",
-                table_name)
-            raise MetaBException(MetaBException.TB_NOT_IN_DB, table_name)
-
-        db_columns = inspector.get_columns(table_name=table_name,
-                                           schema=schema_name)
-        parsed_columns = parsed_table["columns"]
-        if len(parsed_columns) != len(db_columns):
-            config.log.error("Number of columns in db for table %s (%d) "
-                             "differs from number columns in schema (%d)",
-                             table_name, len(db_columns),
-                             len(parsed_columns))
-            raise MetaBException(MetaBException.NOT_MATCHING)
-
-        for column in parsed_columns:
-            column_name = column["name"]
-            if column_name not in db_columns:
-                config.log.error(
-                    "Column '%s.%s' not found in db, "
-                    "but exists in schema DDL",
-                    table_name, column_name)
-                raise MetaBException(MetaBException.COL_NOT_IN_TB,
-                                     column_name, table_name)
+    diff = _diff_schema(parsed_schema, catalog)
+    for table in diff.extra_tables:
+        config.log.info("Table '%s' found in db only", table)
+    report = _format_schema_diff(diff._replace(extra_tables=[]))
+    for line in report:
+        config.log.error(line)
+    if report:
+        raise MetaBException(
+            MetaBException.NOT_MATCHING,
+            "%d differences between db and ascii file" % len(report))
 
     # Get schema description and version, it is ok if it is missing
     ret = target_engine.execute(
@@ -320,5 +825,32 @@ def _check_schema_consistency(config, db_name, schema_name, parsed_schema,
                 MetaBException.NOT_MATCHING,
                 "Schema name or description does not match defined values.")
 
+
+@cli.command("check-schema")
+@click.argument("schema_file")
+@click.argument("schema_name")
+@click.argument("target_url")
+@pass_config
+def check_schema(config, schema_file, schema_name, target_url):
+    """Compare a schema file with a schema of a database server.
+
+    Reports every missing or extra table and column, and every type
+    mismatch; exits with status 1 if any table or column of the schema
+    file is missing or differs.
+
+    :param target_url: SQLAlchemy URL of the database server
+    """
+    try:
+        parsed_schema = parse_schema(schema_file, config.parse_cache)
+    except (IOError, SchemaParseError) as e:
+        raise click.ClickException(str(e))
+    catalog = _catalog_columns(create_engine(target_url), schema_name)
+    diff = _diff_schema(parsed_schema, catalog)
+    for line in _format_schema_diff(diff):
+        click.echo(line)
+    if any(diff._replace(extra_tables=[])):
+        raise click.exceptions.Exit(1)
+    return diff
+
 if __name__ == '__main__':
     cli()
@@ -27,10 +27,16 @@ supported formats: json and html.
 @author Brian Van Klaveren, SLAC
 """
 
-from flask import Blueprint, request, current_app, make_response
+from flask import Blueprint, Response, request, current_app, make_response
 from lsst.dax.webservcommon import render_response
+from .compression import compress_response, compress_streamed_response, \
+    negotiate_encoding
+from .ddl_cache import DdlCache
+from .deadline import DeadlineExceeded, start_request_deadline
+from .instrumentation import start_request_stats, serializing, \
+    add_server_timing, log_request_stats
 
-from http.client import OK, INTERNAL_SERVER_ERROR
+from http.client import OK, INTERNAL_SERVER_ERROR, SERVICE_UNAVAILABLE
 import json
 import logging as log
 import re
@@ -100,11 +106,38 @@ def getDbPerTypeDbNameTablesTableNameSchema(lsstLevel, dbName, tableName):
     '''Retrieves schema for a given table.'''
     # Scalar
     if SAFE_SCHEMA_PATTERN.match(dbName) and SAFE_TABLE_PATTERN.match(tableName):
-        query = "SHOW CREATE TABLE %s.%s" % (dbName, tableName)
-        return _resultsOf(query, scalar=True)
+        try:
+            engine = current_app.config["default_engine"]
+            response = _scalar(_ddlCache().get(engine, dbName, tableName))
+            status_code = OK
+        except SQLAlchemyError as e:
+            log.debug("Encountered an error processing request: '%s'" % e)
+            status_code = INTERNAL_SERVER_ERROR
+            response = _error(type(e).__name__, str(e))
+        return _response(response, status_code)
     return _response(_error("ValueError", "Database name or Table name is not safe"), 400)
 
 
+@metaREST.route('/metrics', methods=['GET'])
+def getMetrics():
+    '''Shows the counters of the SHOW CREATE TABLE cache.'''
+    return _response({"ddl_cache": _ddlCache().stats()}, OK)
+
+
+def _ddlCache():
+    '''Returns the app's cache of SHOW CREATE TABLE results. Its size and
+    TTL (in seconds) are set by the metaserv_ddl_cache_size and
+    metaserv_ddl_cache_ttl config keys.'''
+    cache = current_app.extensions.get("metaserv_ddl_cache")
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions.setdefault(
+            "metaserv_ddl_cache",
+            DdlCache(config.get("metaserv_ddl_cache_size", 1024),
+                     config.get("metaserv_ddl_cache_ttl", 300)))
+    return cache
+
+
 @metaREST.route('/image', methods=['GET'])
 def getImage():
     return "meta/.../image not implemented. I am supposed to print list of " \
@@ -112,6 +145,54 @@ def getImage():
            "jpeg, calexp, ... etc"
 
 
+@metaREST.before_request
+def _startStats():
+    """Record the statements and serialization time of the request, see
+    :mod:`.instrumentation`."""
+    start_request_stats()
+
+
+@metaREST.after_request
+def _serverTiming(response):
+    """Registered first so it runs last, once the body is final."""
+    return add_server_timing(response)
+
+
+@metaREST.teardown_request
+def _logStats(exception=None):
+    log_request_stats()
+
+
+@metaREST.before_request
+def _startDeadline():
+    """Bound the time the request's statements may take, see
+    :mod:`.deadline`."""
+    start_request_deadline()
+
+
+@metaREST.errorhandler(DeadlineExceeded)
+def _deadlineExceeded(error):
+    log.warning("Deadline exceeded for %s" % request.path)
+    response = _response(_error(type(error).__name__, str(error)),
+                         SERVICE_UNAVAILABLE)
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+@metaREST.after_request
+def _compress(response):
+    """Compress the response body, see :mod:`.compression`.
+    Unlike v1, there is no metadata generation to key a cache on, so
+    bodies are compressed on every request. Streamed results are
+    compressed as they are sent."""
+    encoding = negotiate_encoding()
+    if response.is_streamed:
+        compress_streamed_response(response, encoding)
+    else:
+        compress_response(response, encoding)
+    return response
+
+
 _error = lambda exception, message: {"exception": exception, "message": message}
 _vector = lambda results: {"results": results}
 _scalar = lambda result: {"result": result}
@@ -125,20 +206,66 @@ def _resultsOf(query, paramMap=None, scalar=False):
         if scalar:
             result = engine.execute(query, **paramMap).first()
             response = dict(result=dict(result))
+        elif _format() != 'text/html':
+            return _streamedResultsOf(engine, query, paramMap)
         else:
+            # render_response needs the whole response
             results = [list(result) for result in engine.execute(query, **paramMap)]
             response = _vector(results)
     except SQLAlchemyError as e:
-        log.debug("Encountered an error processing request: '%s'" % e.message)
+        log.debug("Encountered an error processing request: '%s'" % e)
         status_code = INTERNAL_SERVER_ERROR
-        response = _error(type(e).__name__, e.message)
+        response = _error(type(e).__name__, str(e))
     return _response(response, status_code)
 
 
+def _streamedResultsOf(engine, query, paramMap):
+    """Run a query on a server-side cursor and stream its rows as JSON,
+    as they are fetched. The output is the same as json.dumps of the
+    whole vector, but neither the rows nor the string are ever held in
+    memory at once."""
+    connection = engine.connect().execution_options(stream_results=True)
+    try:
+        results = connection.execute(query, **paramMap)
+    except SQLAlchemyError:
+        connection.close()
+        raise
+
+    path = request.path
+
+    def close():
+        results.close()
+        connection.close()
+
+    def generate():
+        try:
+            yield '{"results": ['
+            separator = ''
+            for result in results:
+                yield separator + json.dumps(list(result))
+                separator = ', '
+            yield ']}'
+        except Exception:
+            # Too late to change the status code: end the output here,
+            # leaving it truncated (not valid JSON), so clients can tell
+            log.exception("Error while streaming results of %s" % path)
+        finally:
+            close()
+    response = Response(generate(), status=OK, mimetype='application/json')
+    # The generator's finally does not run if it is never started
+    response.call_on_close(close)
+    return response
+
+
+def _format():
+    return request.accept_mimetypes.best_match(['application/json', 'text/html'])
+
+
 def _response(response, status_code):
-    fmt = request.accept_mimetypes.best_match(['application/json', 'text/html'])
-    if fmt == 'text/html':
-        response = render_response(response=response, status_code=status_code)
-    else:
-        response = json.dumps(response)
+    fmt = _format()
+    with serializing():
+        if fmt == 'text/html':
+            response = render_response(response=response, status_code=status_code)
+        else:
+            response = json.dumps(response)
     return make_response(response, status_code)
@@ -27,14 +27,30 @@ supported formats: json and html.
 """
 from collections import OrderedDict
 
-from flask import Blueprint, request, current_app, g, jsonify
+from bisect import bisect_right
 
-from http.client import OK, NOT_FOUND, INTERNAL_SERVER_ERROR
+from flask import Blueprint, request, current_app, g, jsonify, abort, \
+    url_for, json, stream_with_context
+
+from http.client import OK, BAD_REQUEST, NOT_FOUND, NOT_MODIFIED, \
+    INTERNAL_SERVER_ERROR, SERVICE_UNAVAILABLE
+import hashlib
 import logging as log
 import re
-from sqlalchemy import text, or_, and_
-from sqlalchemy.exc import SQLAlchemyError
-from .model import session_maker, MSDatabase, MSDatabaseSchema, MSDatabaseTable
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError
+from sqlalchemy.orm import joinedload, selectinload, load_only, \
+    scoped_session
+from .model import session_maker, get_generation, MSDatabase, \
+    MSDatabaseSchema, MSDatabaseTable, MSDatabaseColumn
+from .deadline import DeadlineExceeded, start_request_deadline
+from .instrumentation import start_request_stats, serializing, \
+    add_server_timing, log_request_stats
+from .compression import CompressionCache, compress_response, \
+    compress_streamed_response, negotiate_encoding
+from .pool import PoolMetrics
+from .snapshot import SnapshotCache, TableEntry, ColumnEntry
 from .api_model import *
 
 SAFE_NAME_REGEX = r'[A-Za-z_$][A-Za-z0-9_$]*$'
@@ -45,12 +61,485 @@ ACCEPT_TYPES = ['application/json', 'text/html']
 metaserv_api_v1 = Blueprint('metaserv_v1', __name__,
                             template_folder="templates")
 
+#: Endpoints without ETag and Cache-Control headers
+_NOT_CACHED = {metaserv_api_v1.name + ".metrics"}
+
+
+def _session_registry():
+    """Return the app's session registry, one session per app context.
+    """
+    registry = current_app.extensions.get("metaserv_session")
+    if registry is None:
+        engine = current_app.config["default_engine"]
+        registry = current_app.extensions.setdefault(
+            "metaserv_session",
+            scoped_session(session_maker(engine),
+                           scopefunc=lambda: id(g._get_current_object())))
+    return registry
+
+
+def _pool_metrics():
+    """Return the app's :class:`.pool.PoolMetrics`."""
+    metrics = current_app.extensions.get("metaserv_pool_metrics")
+    if metrics is None:
+        metrics = current_app.extensions.setdefault(
+            "metaserv_pool_metrics",
+            PoolMetrics(current_app.config["default_engine"]))
+    return metrics
+
 
 def Session():
-    db = getattr(g, '_Session', None)
-    if db is None:
-        db = g._session = session_maker(current_app.config["default_engine"])
-    return db()
+    """Return the session of the current request.
+
+    The first call of a request checks a connection out of the pool,
+    and records how long that took. Aborts with 503 if the pool is
+    exhausted.
+    """
+    registry = _session_registry()
+    if registry.registry.has():
+        return registry()
+    session = registry()
+    metrics = _pool_metrics()
+    start = time.time()
+    try:
+        session.connection()
+    except TimeoutError:
+        metrics.record_timeout()
+        registry.remove()
+        log.warning("Connection pool exhausted")
+        abort(SERVICE_UNAVAILABLE)
+    metrics.record_checkout(time.time() - start)
+    return session
+
+
+@metaserv_api_v1.teardown_request
+def _remove_session(exception=None):
+    """Close the request's session, returning its connection to the
+    pool."""
+    registry = current_app.extensions.get("metaserv_session")
+    if registry is not None:
+        registry.remove()
+
+
+@metaserv_api_v1.before_request
+def _start_stats():
+    """Record the statements and serialization time of the request, see
+    :mod:`.instrumentation`."""
+    start_request_stats()
+
+
+@metaserv_api_v1.after_request
+def _server_timing(response):
+    """Registered first so it runs last, once the body is final."""
+    return add_server_timing(response)
+
+
+@metaserv_api_v1.teardown_request
+def _log_stats(exception=None):
+    log_request_stats()
+
+
+@metaserv_api_v1.before_request
+def _start_deadline():
+    """Bound the time the request's statements may take, see
+    :mod:`.deadline`. Registered before :func:`_check_etag`, so it also
+    covers its queries."""
+    start_request_deadline()
+
+
+@metaserv_api_v1.errorhandler(DeadlineExceeded)
+def _deadline_exceeded(error):
+    """Fail fast with 503 and a ``Retry-After`` header."""
+    log.warning("Deadline exceeded for %s", request.path)
+    response = jsonify({"exception": type(error).__name__,
+                        "message": str(error)})
+    response.status_code = SERVICE_UNAVAILABLE
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def _snapshot(session):
+    """Return the in-memory metadata snapshot, or None if disabled.
+
+    The snapshot is enabled with the ``metaserv_snapshot`` config key.
+    ``metaserv_snapshot_check_interval`` sets the minimum number of
+    seconds between two checks of the metadata generation. The same
+    snapshot is used for the whole request.
+    """
+    config = current_app.config
+    if not config.get("metaserv_snapshot", False):
+        return None
+    snapshot = getattr(g, "metaserv_snapshot", None)
+    if snapshot is None:
+        cache = current_app.extensions.get("metaserv_snapshot")
+        if cache is None:
+            cache = current_app.extensions.setdefault(
+                "metaserv_snapshot",
+                SnapshotCache(config.get("metaserv_snapshot_check_interval",
+                                         0)))
+        snapshot = g.metaserv_snapshot = cache.get(session)
+    return snapshot
+
+
+def _identified_by(model, identifier):
+    """Return the filter selecting a row of ``model`` by identifier.
+
+    Names never start with a digit, so an identifier made of ASCII
+    digits only is an id, and anything else a name. Either way the
+    filter is a single indexed equality, unlike ``or_(id == x, name ==
+    x)``.
+    """
+    # isdigit alone accepts other digits, e.g. "²", which int() rejects
+    if identifier.isascii() and identifier.isdigit():
+        return model.id == int(identifier)
+    return model.name == identifier
+
+
+def _lookup_schema(session, db_id, schema_id=None, snapshot=None):
+    """Resolve a database and one of its schemas in a single query.
+
+    :param session: Session to query with
+    :param db_id: Name or ID of the database
+    :param schema_id: Name or ID of the schema. If none, use default.
+    :param snapshot: If provided, resolve from this snapshot instead.
+    :returns: A ``(database, schema)`` tuple. Aborts with 404 if
+    either could not be found.
+    """
+    if snapshot is not None:
+        result = snapshot.lookup_schema(db_id, schema_id)
+        if result is None:
+            abort(NOT_FOUND)
+        return result
+    query = session.query(MSDatabase, MSDatabaseSchema).join(
+        MSDatabaseSchema, MSDatabaseSchema.db_id == MSDatabase.id
+    ).filter(_identified_by(MSDatabase, db_id))
+    if schema_id is not None:
+        query = query.filter(_identified_by(MSDatabaseSchema, schema_id))
+    else:
+        query = query.filter(MSDatabaseSchema.is_default_schema == True)
+    result = query.first()
+    if result is None:
+        abort(NOT_FOUND)
+    return result
+
+
+def _page_args():
+    """Parse the keyset pagination query parameters.
+
+    ``limit`` is the maximum number of results in a page, ``after`` the
+    key (id, or ordinal for columns) of the last result of the previous
+    page. Aborts with 400 if either is not an integer.
+
+    :returns: A ``(limit, after)`` tuple, either may be None.
+    """
+    try:
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+        after = request.args.get("after")
+        after = int(after) if after is not None else None
+    except ValueError:
+        abort(BAD_REQUEST)
+    if limit is not None and limit < 1:
+        abort(BAD_REQUEST)
+    return limit, after
+
+
+def _keyset_query(query, key, limit, after):
+    """Restrict a query to a page, ordered by ``key``.
+
+    One more row than ``limit`` is fetched, so :func:`_page` can tell
+    whether there is a next page.
+    """
+    query = query.order_by(key)
+    if after is not None:
+        query = query.filter(key > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query.all()
+
+
+def _keyset_slice(items, key, limit, after):
+    """Same as :func:`_keyset_query`, for a list sorted by ``key``."""
+    start = 0
+    if after is not None:
+        start = bisect_right([key(item) for item in items], after)
+    if limit is not None:
+        return items[start:start + limit + 1]
+    return items[start:]
+
+
+def _page(items, key, limit):
+    """Trim a page fetched by :func:`_keyset_query` or
+    :func:`_keyset_slice` to ``limit``.
+
+    :returns: A ``(items, next_url)`` tuple, ``next_url`` is None on the
+    last page.
+    """
+    if limit is None or len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, _next_url(limit, key(items[-1]))
+
+
+def _next_url(limit, after):
+    """URL of the page following the current request's."""
+    args = request.args.to_dict()
+    args.update(request.view_args)
+    args["limit"] = limit
+    args["after"] = after
+    return url_for(request.endpoint, _external=True, **args)
+
+
+def _streaming():
+    """Tell whether the response should be streamed, either because of
+    the ``stream`` query parameter or the ``metaserv_stream`` config key.
+    """
+    stream = request.args.get("stream")
+    if stream is not None:
+        return stream.lower() not in ("false", "0", "no")
+    return current_app.config.get("metaserv_stream", False)
+
+
+def _iter_tables(session, schema, with_columns, after=None):
+    """Iterate over the tables of a schema, in id order, with their
+    columns if requested.
+
+    The tables and their columns are read with a single joined query
+    on a server-side cursor, so only one table is held in memory at a
+    time.
+
+    :returns: An iterator of :class:`.snapshot.TableEntry`
+    """
+    entities = [MSDatabaseTable.id, MSDatabaseTable.schema_id,
+                MSDatabaseTable.name, MSDatabaseTable.description]
+    if with_columns:
+        entities += [
+            MSDatabaseColumn.id, MSDatabaseColumn.table_id,
+            MSDatabaseColumn.name, MSDatabaseColumn.description,
+            MSDatabaseColumn.ordinal, MSDatabaseColumn.ucd,
+            MSDatabaseColumn.unit, MSDatabaseColumn.datatype,
+            MSDatabaseColumn.nullable, MSDatabaseColumn.arraysize]
+    query = session.query(*entities).filter(
+        MSDatabaseTable.schema_id == schema.id)
+    if after is not None:
+        query = query.filter(MSDatabaseTable.id > after)
+    if with_columns:
+        query = query.outerjoin(
+            MSDatabaseColumn, MSDatabaseColumn.table_id == MSDatabaseTable.id
+        ).order_by(MSDatabaseTable.id, MSDatabaseColumn.ordinal)
+    else:
+        query = query.order_by(MSDatabaseTable.id)
+    rows = query.execution_options(stream_results=True).yield_per(1000)
+
+    table = None
+    for row in rows:
+        if table is None or table.id != row[0]:
+            if table is not None:
+                yield table
+            table = TableEntry(*row[:4])
+        if with_columns and row[4] is not None:
+            table.columns.append(ColumnEntry(*row[4:]))
+    if table is not None:
+        yield table
+
+
+def _stream_json(head, items, dump, tail=None, limit=None, key=None):
+    """Stream a JSON document holding a list of items.
+
+    :param head: JSON text up to the opening bracket of the list
+    :param items: Iterator of the items
+    :param dump: Function turning an item into a JSON-able value
+    :param tail: Function of the next page URL (or None) returning the
+    JSON text closing the document
+    :param limit: If provided, stop after this many items
+    :param key: Function returning the pagination key of an item
+    """
+    yield head
+    last = None
+    count = 0
+    # Includes fetching the items, which is interleaved with dumping
+    with serializing():
+        for item in items:
+            if limit is not None and count == limit:
+                break
+            yield ("," if count else "") + json.dumps(dump(item))
+            last = item
+            count += 1
+        else:
+            limit = None
+    close = getattr(items, "close", None)
+    if close is not None:
+        close()
+    next_url = None
+    if limit is not None:
+        next_url = _next_url(limit, key(last))
+    yield tail(next_url)
+
+
+def _stream_response(generator):
+    return current_app.response_class(stream_with_context(generator),
+                                      mimetype="application/json")
+
+
+def _projection(schema_class):
+    """Parse the field projection query parameters for a schema.
+
+    ``fields`` is a comma-separated list of the fields to return, and
+    ``columns=false`` drops the nested columns of tables. Aborts with
+    400 on unknown fields.
+
+    :returns: Keyword arguments (``only``, ``exclude``) for the schema.
+    """
+    declared = schema_class._declared_fields
+    projection = {}
+    fields = request.args.get("fields")
+    if fields:
+        only = tuple(field.strip() for field in fields.split(",")
+                     if field.strip())
+        if not set(only) <= set(declared):
+            abort(BAD_REQUEST)
+        projection["only"] = only
+    columns = request.args.get("columns", "true").lower()
+    if "columns" in declared and columns in ("false", "0", "no"):
+        projection["exclude"] = ("columns",)
+    return projection
+
+
+def _projects(projection, field):
+    """Tell whether a projection from :func:`_projection` keeps a field.
+    """
+    return field in projection.get("only", (field,)) and \
+        field not in projection.get("exclude", ())
+
+
+def _table_loading(projection):
+    """Loader options for the tables matching a projection.
+
+    Columns are only loaded if requested, and a listing of table names
+    only reads the (schema_id, name) index.
+    """
+    if _projects(projection, "columns"):
+        return [selectinload(MSDatabaseTable.columns)]
+    if not _projects(projection, "description"):
+        return [load_only(MSDatabaseTable.id, MSDatabaseTable.name)]
+    return []
+
+
+def _generation(session):
+    """Return the current metadata generation, or None if the store
+    does not track it."""
+    snapshot = _snapshot(session)
+    if snapshot is not None:
+        return snapshot.generation
+    try:
+        return get_generation(session)
+    except SQLAlchemyError as e:
+        log.debug("Metadata generation not available: '%s'", e)
+        session.rollback()
+        return None
+
+
+@metaserv_api_v1.before_request
+def _check_etag():
+    """Answer conditional GETs from the metadata generation.
+
+    The ETag of a response is derived from the generation, the full
+    request URL (responses embed absolute URLs), the negotiated format
+    and content encoding, so a matching ``If-None-Match`` is answered
+    with 304 before the view queries or serializes anything.
+
+    Likewise, a body compressed by an earlier request for the same ETag
+    is sent from the compression cache.
+    """
+    g.metaserv_encoding = negotiate_encoding()
+    if request.method != 'GET' or request.endpoint in _NOT_CACHED:
+        return None
+    generation = _generation(Session())
+    if generation is None:
+        return None
+    fmt = request.accept_mimetypes.best_match(ACCEPT_TYPES)
+    key = "%d|%s|%s|%s" % (generation, request.url, fmt,
+                           g.metaserv_encoding)
+    g.metaserv_etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    # If-None-Match uses the weak comparison (RFC 7232, 3.2)
+    if request.if_none_match.contains_weak(g.metaserv_etag):
+        response = current_app.response_class(status=NOT_MODIFIED)
+        response.set_etag(g.metaserv_etag)
+        return response
+    cached = _compression_cache().get(g.metaserv_etag)
+    if cached is not None:
+        mimetype, encoding, body = cached
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
+    return None
+
+
+def _compression_cache():
+    """Return the app's cache of compressed v1 responses."""
+    cache = current_app.extensions.get("metaserv_compression_cache")
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions.setdefault(
+            "metaserv_compression_cache",
+            CompressionCache(
+                config.get("metaserv_compression_cache_size", 256),
+                config.get("metaserv_compression_cache_bytes",
+                           32 * 1024 * 1024)))
+    return cache
+
+
+@metaserv_api_v1.after_request
+def _set_cache_headers(response):
+    """Add the ETag and the Cache-Control headers.
+
+    If the generation is not available, the ETag is a hash of the body.
+    The Cache-Control value is taken from the ``metaserv_cache_control``
+    config key, e.g. ``"public, max-age=300"``.
+    """
+    if request.method != 'GET' or request.endpoint in _NOT_CACHED or \
+            response.status_code not in (OK, NOT_MODIFIED):
+        return response
+    etag = getattr(g, "metaserv_etag", None)
+    if etag is not None:
+        response.set_etag(etag)
+    elif response.status_code == OK and not response.is_streamed:
+        response.add_etag()
+        response.make_conditional(request)
+    cache_control = current_app.config.get("metaserv_cache_control")
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
+@metaserv_api_v1.after_request
+def _compress(response):
+    """Compress the response body, see :mod:`.compression`.
+
+    Runs before :func:`_set_cache_headers`, so hashes of the body are
+    computed on the compressed bytes. Bodies with a generation-based
+    ETag are kept in the compression cache. Streamed bodies are
+    compressed as they are sent, and not cached.
+    """
+    encoding = getattr(g, "metaserv_encoding", None)
+    if response.is_streamed:
+        compress_streamed_response(response, encoding)
+    elif compress_response(response, encoding):
+        etag = getattr(g, "metaserv_etag", None)
+        if etag is not None:
+            _compression_cache().put(
+                etag, (response.mimetype, encoding, response.get_data()))
+    return response
+
+
+@metaserv_api_v1.route('/metrics/', methods=['GET'])
+def metrics():
+    """Show the connection pool statistics of this process.
+
+    :statuscode 200: No Error
+    """
+    return jsonify({"pool": _pool_metrics().as_dict()})
 
 
 @metaserv_api_v1.route('/', methods=['GET'])
@@ -92,13 +581,33 @@ def databases():
             ]
         }
 
+    :query limit: Maximum number of databases to return. If there are
+    more, the response has a ``next`` URL to the following page.
+    :query after: Return only databases with a greater id.
+    :query fields: Comma-separated list of the fields to return.
+
     :statuscode 200: No Error
+    :statuscode 400: Invalid pagination or projection parameters
     """
+    limit, after = _page_args()
+    db_schema = compiled_schema(Database, **_projection(Database))
     db = Session()
-    db_schema = Database(many=True)
-    databases = db.query(MSDatabase).all()
-    results = db_schema.dump(databases)
-    return jsonify({"results": results.data})
+    snapshot = _snapshot(db)
+    if snapshot is not None:
+        databases = _keyset_slice(snapshot.databases, lambda db: db.id,
+                                  limit, after)
+    else:
+        # Resolve every default schema in the same (joined) query
+        databases = _keyset_query(
+            db.query(MSDatabase).options(
+                joinedload(MSDatabase.default_schema)),
+            MSDatabase.id, limit, after)
+    databases, next_url = _page(databases, lambda db: db.id, limit)
+    with serializing():
+        response = OrderedDict(results=db_schema.dump(databases, many=True))
+        if next_url is not None:
+            response["next"] = next_url
+        return jsonify(response)
 
 
 @metaserv_api_v1.route('/db/<string:db_id>/', methods=['GET'])
@@ -144,16 +653,23 @@ def database(db_id):
     :statuscode 404: No database with that id found.
     """
     session = Session()
-    database = session.query(MSDatabase).filter(
-        or_(MSDatabase.id == db_id, MSDatabase.name == db_id)).first()
+    snapshot = _snapshot(session)
+    if snapshot is not None:
+        database = snapshot.database(db_id)
+    else:
+        database = session.query(MSDatabase).filter(
+            _identified_by(MSDatabase, db_id)
+        ).options(joinedload(MSDatabase.default_schema)).first()
+    if database is None:
+        abort(NOT_FOUND)
     request.database = database
-    db_schema = Database()
-    schemas_schema = DatabaseSchema(many=True)
-    db_result = db_schema.dump(database)
-    schemas_result = schemas_schema.dump(database.schemas)
-    response = OrderedDict(db_result.data)
-    response["schemas"] = schemas_result.data
-    return jsonify(response)
+    db_schema = compiled_schema(Database)
+    schemas_schema = compiled_schema(DatabaseSchema)
+    with serializing():
+        response = db_schema.dump(database)
+        response["schemas"] = schemas_schema.dump(database.schemas,
+                                                  many=True)
+        return jsonify(response)
 
 
 @metaserv_api_v1.route('/db/<string:db_id>/<string:schema_id>/tables/',
@@ -234,35 +750,65 @@ def tables(db_id, schema_id=None):
 
     :param db_id: Database identifier
     :param schema_id: Name or ID of the schema. If none, use default.
+    :query limit: Maximum number of tables to return. If there are
+    more, the response has a ``next`` URL to the following page.
+    :query after: Return only tables with a greater id.
+    :query fields: Comma-separated list of the table fields to return.
+    Columns are only read if ``columns`` is one of them.
+    :query columns: If ``false``, do not return (nor read) the columns.
+    :query stream: If ``true``, stream the response while the tables are
+    read from the database. The default is the ``metaserv_stream``
+    config key.
 
     :statuscode 200: No Error
+    :statuscode 400: Invalid pagination or projection parameters
     :statuscode 404: No database with that id found.
     """
+    limit, after = _page_args()
+    projection = _projection(DatabaseTable)
     session = Session()
-    # This sends out 3 queries. It could be optimized into one large
-    # Join query.
-    database = session.query(MSDatabase).filter(
-        or_(MSDatabase.id == db_id, MSDatabase.name == db_id)).first()
+    snapshot = _snapshot(session)
+    # One query for the database and schema, one for the tables and
+    # one for all of their columns (if requested), regardless of the
+    # number of tables.
+    database, schema = _lookup_schema(session, db_id, schema_id, snapshot)
     request.database = database
 
-    if schema_id is not None:
-        schema = database.schemas.filter(or_(
-            MSDatabaseSchema.id == schema_id,
-            MSDatabaseSchema.name == schema_id
-        )).scalar()
+    schema_schema = compiled_schema(DatabaseSchema)
+    if _streaming():
+        if snapshot is not None:
+            tables = iter(_keyset_slice(schema.tables,
+                                        lambda table: table.id, None, after))
+        else:
+            tables = _iter_tables(session, schema,
+                                  _projects(projection, "columns"), after)
+        head = '{"results":{"schema":%s,"tables":[' % json.dumps(
+            schema_schema.dump(schema))
+        return _stream_response(_stream_json(
+            head, tables,
+            compiled_schema(DatabaseTable, **projection).bind(),
+            lambda next_url: "]}" + (
+                ',"next":%s' % json.dumps(next_url) if next_url else "") +
+            "}",
+            limit, lambda table: table.id))
+    if snapshot is not None:
+        tables = _keyset_slice(schema.tables, lambda table: table.id,
+                               limit, after)
     else:
-        schema = database.default_schema.scalar()
-
-    schema_schema = DatabaseSchema()
-    schema_result = schema_schema.dump(schema)
-    tables = session.query(MSDatabaseTable).filter(
-        MSDatabaseTable.schema_id == schema.id).all()
-    table_schema = DatabaseTable(many=True)
-    tables_result = table_schema.dump(tables)
-    return jsonify({"results": {
-        "schema": schema_result.data,
-        "tables": tables_result.data}
-    })
+        tables = _keyset_query(
+            session.query(MSDatabaseTable).filter(
+                MSDatabaseTable.schema_id == schema.id
+            ).options(*_table_loading(projection)),
+            MSDatabaseTable.id, limit, after)
+    tables, next_url = _page(tables, lambda table: table.id, limit)
+    table_schema = compiled_schema(DatabaseTable, **projection)
+    with serializing():
+        response = OrderedDict(results={
+            "schema": schema_schema.dump(schema),
+            "tables": table_schema.dump(tables, many=True)})
+        if next_url is not None:
+            response["next"] = next_url
+        return jsonify(response)
 
 
 @metaserv_api_v1.route('/db/<string:db_id>/<string:schema_id>/tables/'
@@ -325,32 +871,187 @@ def table(db_id, table_id, schema_id=None):
     :query description: If supplied, must be one of the following:
        `content`
     in the response, including the columns of the tables.
+    :query fields: Comma-separated list of the table fields to return.
+    :query columns: If ``false``, do not return (nor read) the columns.
 
     :statuscode 200: No Error
+    :statuscode 400: Invalid projection parameters
     :statuscode 404: No database with that id found.
     """
+    projection = _projection(DatabaseTable)
     session = Session()
-    # This sends out 3 queries. It could be optimized into one large
-    # Join query.
-    database = session.query(MSDatabase).filter(
-        or_(MSDatabase.id == db_id, MSDatabase.name == db_id)).scalar()
+    snapshot = _snapshot(session)
+    database, schema = _lookup_schema(session, db_id, schema_id, snapshot)
     request.database = database
-    if schema_id is not None:
-        schema = database.schemas.filter(or_(
-            MSDatabaseSchema.id == schema_id,
-            MSDatabaseSchema.name == schema_id
-        )).scalar()
+
+    if snapshot is not None:
+        table = schema.table(table_id)
+    else:
+        table = session.query(MSDatabaseTable).filter(
+            MSDatabaseTable.schema_id == schema.id,
+            _identified_by(MSDatabaseTable, table_id)
+        ).options(*_table_loading(projection)).scalar()
+    if table is None:
+        abort(NOT_FOUND)
+
+    table_schema = compiled_schema(DatabaseTable, **projection)
+    with serializing():
+        return jsonify({"result:": table_schema.dump(table)})
+
+
+@metaserv_api_v1.route('/db/<string:db_id>/<string:schema_id>/tables/'
+                       '<table_id>/columns/',
+                       methods=['GET'])
+@metaserv_api_v1.route('/db/<string:db_id>/tables/<table_id>/columns/',
+                       methods=['GET'])
+def columns(db_id, table_id, schema_id=None):
+    """List the columns of a table, in ordinal order.
+
+    **Example request**
+    .. code-block:: http
+        GET /db/S12_sdss/tables/Object/columns/?limit=2 HTTP/1.1
+        Accept: application/json
+        Accept-Encoding: gzip, deflate
+        Connection: keep-alive
+        Host: localhost:5000
+        User-Agent: python-requests/2.13.0
+
+    **Example response**
+    .. code-block:: http
+       HTTP/1.1 200 OK
+       Content-Type: application/json
+       Server: Werkzeug/0.11.3 Python/2.7.10
+
+        {
+            "results": [
+                  { "name": "objectId",
+                    "description": "Unique object id.",
+                    "ordinal": 0,
+                    "datatype": "int"
+                    "ucd": "meta.id;src"
+                  },
+                  { "name": "ra",
+                    "description": "RA of mean source cluster posi...",
+                    "ordinal": 1,
+                    "datatype": "double",
+                    "ucd": "pos.eq.ra",
+                    "unit": "deg"
+                  }
+            ],
+            "next": "http://localhost:5000/meta/v1/db/S12_sdss/tables/
+                     Object/columns/?limit=2&after=1"
+        }
+
+    :param db_id: Database identifier
+    :param table_id: Name or ID of the table or view
+    :param schema_id: Name or ID of the schema. If none, use default.
+    :query limit: Maximum number of columns to return. If there are
+    more, the response has a ``next`` URL to the following page.
+    :query after: Return only columns with a greater ordinal.
+    :query fields: Comma-separated list of the column fields to return.
+
+    :statuscode 200: No Error
+    :statuscode 400: Invalid pagination or projection parameters
+    :statuscode 404: No table with that id found.
+    """
+    limit, after = _page_args()
+    column_schema = compiled_schema(DatabaseColumn,
+                                    **_projection(DatabaseColumn))
+    session = Session()
+    snapshot = _snapshot(session)
+    database, schema = _lookup_schema(session, db_id, schema_id, snapshot)
+    request.database = database
+
+    if snapshot is not None:
+        table = schema.table(table_id)
+        if table is None:
+            abort(NOT_FOUND)
+        columns = _keyset_slice(table.columns, lambda column: column.ordinal,
+                                limit, after)
+    else:
+        table_pk = session.query(MSDatabaseTable.id).filter(
+            MSDatabaseTable.schema_id == schema.id,
+            _identified_by(MSDatabaseTable, table_id)
+        ).scalar()
+        if table_pk is None:
+            abort(NOT_FOUND)
+        columns = _keyset_query(
+            session.query(MSDatabaseColumn).filter(
+                MSDatabaseColumn.table_id == table_pk),
+            MSDatabaseColumn.ordinal, limit, after)
+    columns, next_url = _page(columns, lambda column: column.ordinal, limit)
+    with serializing():
+        response = OrderedDict(results=column_schema.dump(columns,
+                                                          many=True))
+        if next_url is not None:
+            response["next"] = next_url
+        return jsonify(response)
+
+
+@metaserv_api_v1.route('/db/<string:db_id>/<string:schema_id>/dump/',
+                       methods=['GET'])
+@metaserv_api_v1.route('/db/<string:db_id>/dump/', methods=['GET'])
+def dump(db_id, schema_id=None):
+    """Dump a whole schema: database, schema, tables and columns.
+
+    The response is streamed while the tables and their columns are
+    read, so its size is not limited by the memory of the server.
+
+    **Example request**
+    .. code-block:: http
+        GET /db/S12_sdss/dump/ HTTP/1.1
+        Accept: application/json
+        Accept-Encoding: gzip, deflate
+        Connection: keep-alive
+        Host: localhost:5000
+        User-Agent: python-requests/2.13.0
+
+    **Example response**
+    .. code-block:: http
+       HTTP/1.1 200 OK
+       Content-Type: application/json
+       Server: Werkzeug/0.11.3 Python/2.7.10
+
+        {
+            "result": {
+                "database": {
+                    "name":"S12_sdss",
+                    ...
+                },
+                "schema": {
+                    "name": "sdss_stripe82_00",
+                    ...
+                },
+                "tables": [
+                    { "name": "Object",
+                      "description": "The Object table contains descript...",
+                      "columns": [
+                          ...
+                      ]
+                    },
+                    ...
+                ]
+            }
+        }
+
+    :param db_id: Database identifier
+    :param schema_id: Name or ID of the schema. If none, use default.
+
+    :statuscode 200: No Error
+    :statuscode 404: No database with that id found.
+    """
+    session = Session()
+    snapshot = _snapshot(session)
+    database, schema = _lookup_schema(session, db_id, schema_id, snapshot)
+    request.database = database
+
+    if snapshot is not None:
+        tables = iter(schema.tables)
     else:
-        schema = database.default_schema.scalar()
-
-    table = session.query(MSDatabaseTable).filter(and_(
-        MSDatabaseTable.schema_id == schema.id,
-        or_(
-            MSDatabaseTable.name == table_id,
-            MSDatabaseTable.id == table_id)
-        )
-    ).scalar()
-
-    table_schema = DatabaseTable()
-    tables_result = table_schema.dump(table)
-    return jsonify({"result:": tables_result.data})
+        tables = _iter_tables(session, schema, True)
+    head = '{"result":{"database":%s,"schema":%s,"tables":[' % (
+        json.dumps(compiled_schema(Database).dump(database)),
+        json.dumps(compiled_schema(DatabaseSchema).dump(schema)))
+    return _stream_response(_stream_json(
+        head, tables, compiled_schema(DatabaseTable).bind(),
+        lambda next_url: "]}}"))
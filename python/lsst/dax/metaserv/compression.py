@@ -0,0 +1,227 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Compression of response bodies, negotiated with ``Accept-Encoding``.
+
+gzip is always available. brotli (``br``) and zstd are used if the
+``brotli`` and ``zstandard`` modules are installed.
+
+The following config keys are supported:
+
+``metaserv_compression``
+    Enables compression, True by default.
+``metaserv_compression_level``
+    Compression level, 6 by default.
+``metaserv_compression_min_size``
+    Bodies smaller than this number of bytes are sent as is, 512 by
+    default.
+``metaserv_compression_cache_size``
+    Number of compressed bodies kept by :class:`CompressionCache`, 256
+    by default.
+``metaserv_compression_cache_bytes``
+    Total size of the bodies kept by :class:`CompressionCache`, 32 MiB
+    by default.
+"""
+
+from collections import OrderedDict
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from flask import current_app, request
+
+
+def _gzip(data, level):
+    # Unlike gzip.compress, no timestamp: the same input always gives
+    # the same bytes.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=min(level, 11))
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _gzip_stream(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class _BrotliStream(object):
+    """brotli.Compressor, with the interface of zlib.compressobj."""
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _zstd_stream(level):
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+#: Available encodings, in order of preference
+COMPRESSORS = OrderedDict()
+#: Incremental compressors of the same encodings, with compress() and
+#: flush() methods
+STREAM_COMPRESSORS = OrderedDict()
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _zstd
+    STREAM_COMPRESSORS["zstd"] = _zstd_stream
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+    STREAM_COMPRESSORS["br"] = _BrotliStream
+COMPRESSORS["gzip"] = _gzip
+STREAM_COMPRESSORS["gzip"] = _gzip_stream
+
+
+def negotiate_encoding():
+    """Return the encoding to use for the current request, None for the
+    identity encoding."""
+    if not current_app.config.get("metaserv_compression", True):
+        return None
+    return request.accept_encodings.best_match(list(COMPRESSORS))
+
+
+def compress_response(response, encoding):
+    """Compress the body of a response in place, if worth it.
+
+    Streamed responses (see :func:`compress_streamed_response`), errors
+    and responses which already have a ``Content-Encoding`` are left
+    alone.
+
+    :param response: The response
+    :param encoding: Result of :func:`negotiate_encoding`
+    :returns: True if the body was compressed.
+    """
+    if response.status_code != 200 or response.is_streamed or \
+            response.direct_passthrough or \
+            "Content-Encoding" in response.headers:
+        return False
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return False
+    config = current_app.config
+    data = response.get_data()
+    if len(data) < config.get("metaserv_compression_min_size", 512):
+        return False
+    level = config.get("metaserv_compression_level", 6)
+    response.set_data(COMPRESSORS[encoding](data, level))
+    response.headers["Content-Encoding"] = encoding
+    return True
+
+
+def _compressed_chunks(chunks, compressor, charset):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_streamed_response(response, encoding):
+    """Compress the body of a streamed response chunk by chunk, as it is
+    sent.
+
+    Like :func:`compress_response`, errors and responses which already
+    have a ``Content-Encoding`` are left alone. There is no minimum size,
+    as the size is not known in advance.
+
+    :param response: The response
+    :param encoding: Result of :func:`negotiate_encoding`
+    :returns: True if the body will be compressed.
+    """
+    if response.status_code != 200 or not response.is_streamed or \
+            "Content-Encoding" in response.headers:
+        return False
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return False
+    level = current_app.config.get("metaserv_compression_level", 6)
+    response.response = _compressed_chunks(
+        response.response, STREAM_COMPRESSORS[encoding](level),
+        response.charset)
+    response.headers.pop("Content-Length", None)
+    response.headers["Content-Encoding"] = encoding
+    return True
+
+
+class CompressionCache(object):
+    """LRU cache of compressed bodies, bounded by number of entries and
+    by total size of the bodies. A body larger than the size bound is
+    not cached.
+
+    Keys must identify the representation, including its encoding, e.g.
+    an ETag derived from the metadata generation. Values are
+    ``(mimetype, encoding, body)`` tuples.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = len(value[2])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or \
+                    self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[2])
@@ -0,0 +1,123 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Cache of ``SHOW CREATE TABLE`` results.
+
+``SHOW CREATE TABLE`` is slow on Qserv-fronted catalogs and takes
+metadata locks. Results are kept for a configurable time (TTL). Once
+it has passed, the entry is revalidated against the ``CREATE_TIME`` and
+``UPDATE_TIME`` of the table in ``information_schema``, and the DDL is
+only fetched again if either changed.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from sqlalchemy import text
+
+_TABLE_TIMES = text(
+    "SELECT CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = :dbName AND TABLE_NAME = :tableName")
+
+
+class _Entry(object):
+
+    def __init__(self, ddl, table_times, checked):
+        self.ddl = ddl
+        self.table_times = table_times
+        self.checked = checked
+
+
+class DdlCache(object):
+    """LRU cache of ``SHOW CREATE TABLE`` results, keyed by
+    ``(dbName, tableName)``.
+
+    :param max_entries: Maximum number of tables kept
+    :param ttl: Number of seconds an entry is used without revalidation
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, engine, dbName, tableName):
+        """Return the ``SHOW CREATE TABLE`` row of a table, as a dict.
+
+        The names must have been checked to be safe identifiers.
+        """
+        key = (dbName, tableName)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now - entry.checked < self.ttl:
+                    self.hits += 1
+                    return entry.ddl
+
+        table_times = self._table_times(engine, dbName, tableName)
+        if entry is not None and entry.table_times == table_times:
+            with self._lock:
+                self.hits += 1
+                self.revalidations += 1
+                entry.checked = now
+            return entry.ddl
+
+        result = engine.execute(
+            "SHOW CREATE TABLE %s.%s" % (dbName, tableName)).first()
+        ddl = dict(result)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = _Entry(ddl, table_times, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return ddl
+
+    @staticmethod
+    def _table_times(engine, dbName, tableName):
+        row = engine.execute(_TABLE_TIMES, dbName=dbName,
+                             tableName=tableName).first()
+        return tuple(row) if row is not None else None
+
+    def invalidate(self, dbName=None, tableName=None):
+        """Drop one table, or every entry if no table is given."""
+        with self._lock:
+            if dbName is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((dbName, tableName), None)
+
+    def stats(self):
+        """Return the counters, and the number of entries."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "revalidations": self.revalidations,
+                    "evictions": self.evictions,
+                    "entries": len(self._entries)}
@@ -0,0 +1,250 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Per-request deadlines for the statements sent to the backend.
+
+Each request gets a deadline when it starts. Every statement it
+executes is bounded by the time left:
+
+* on MySQL, SELECT statements carry a ``MAX_EXECUTION_TIME`` hint, so
+  the server aborts them;
+* a watchdog thread cancels any statement still running at the
+  deadline, with ``KILL QUERY`` on MySQL (which also covers ``SHOW``
+  statements) or by interrupting the connection on SQLite. ``KILL
+  QUERY`` is sent over a connection of its own, outside of the engine's
+  pool, so it works when the pool is exhausted.
+
+A statement aborted either way, or started after the deadline, raises
+:class:`DeadlineExceeded`, which the APIs turn into a 503 response
+with a ``Retry-After`` header.
+
+The following config keys are supported:
+
+``metaserv_statement_timeout``
+    Default deadline of a request, in seconds, 30 by default. None
+    disables deadlines.
+``metaserv_statement_timeouts``
+    Dict of deadlines per endpoint name, e.g.
+    ``{"metaREST.getDbPerTypeDbNameTablesTableNameSchema": 5}``.
+``metaserv_retry_after``
+    Value of the ``Retry-After`` header, in seconds, 5 by default.
+"""
+
+import heapq
+import itertools
+import logging as log
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+#: MySQL errors of statements that were killed, or timed out on the
+#: server
+_MYSQL_INTERRUPTED = (1317, 3024)
+
+
+class DeadlineExceeded(Exception):
+    """The deadline of the request was exceeded."""
+
+    def __init__(self, retry_after):
+        Exception.__init__(self, "Deadline exceeded")
+        self.retry_after = retry_after
+
+
+class Deadline(object):
+
+    def __init__(self, timeout, retry_after):
+        self.expires = time.time() + timeout
+        self.retry_after = retry_after
+        self.cancelled = False
+
+    def remaining(self):
+        return self.expires - time.time()
+
+
+class Watchdog(object):
+    """Calls functions at given times, from a single daemon thread
+    started on first use."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._entries = []
+        self._cancelled = 0
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, when, function, *args):
+        """Call function(*args) at time when (as of time.time()).
+
+        :returns: A handle for :meth:`cancel`
+        """
+        entry = [when, next(self._counter), function, args]
+        with self._condition:
+            heapq.heappush(self._entries, entry)
+            if self._thread is None or not self._thread.is_alive():
+                # Also after a fork, which only keeps the calling thread
+                self._thread = threading.Thread(target=self._run,
+                                                name="metaserv-watchdog")
+                self._thread.daemon = True
+                self._thread.start()
+            elif self._entries[0] is entry:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        """Cancel a call, unless it already started."""
+        with self._condition:
+            if entry[2] is None:
+                return
+            entry[2] = None
+            self._cancelled += 1
+            # Cancelled entries are left in the heap; drop them once
+            # they are the majority
+            if self._cancelled > 64 and \
+                    self._cancelled * 2 > len(self._entries):
+                self._entries = [e for e in self._entries
+                                 if e[2] is not None]
+                heapq.heapify(self._entries)
+                self._cancelled = 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    while self._entries and self._entries[0][2] is None:
+                        heapq.heappop(self._entries)
+                        self._cancelled -= 1
+                    if not self._entries:
+                        self._condition.wait()
+                        continue
+                    delay = self._entries[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                entry = heapq.heappop(self._entries)
+                function, args = entry[2], entry[3]
+                entry[2] = None
+            try:
+                function(*args)
+            except Exception:
+                log.exception("Watchdog call failed")
+
+
+_watchdog = Watchdog()
+
+#: Engines sending KILL QUERY, by URL of the engine whose statements
+#: they cancel
+_cancel_engines = {}
+
+
+def start_request_deadline():
+    """Start the deadline of the current request, from the config.
+
+    To be called from a ``before_request`` hook, before any statement.
+    """
+    config = current_app.config
+    timeout = config.get("metaserv_statement_timeouts", {}).get(
+        request.endpoint, config.get("metaserv_statement_timeout", 30))
+    if timeout is None:
+        return
+    install(config["default_engine"])
+    g.metaserv_deadline = Deadline(timeout,
+                                   config.get("metaserv_retry_after", 5))
+
+
+def _current_deadline():
+    if not has_app_context():
+        return None
+    return g.get("metaserv_deadline")
+
+
+def install(engine):
+    """Enforce request deadlines on the statements of an engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        if engine.dialect.name == "mysql":
+            _cancel_engines.setdefault(
+                str(engine.url), create_engine(engine.url, poolclass=NullPool))
+        event.listen(engine, "before_cursor_execute", _before_execute,
+                     retval=True)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_execute(conn, cursor, statement, parameters, context,
+                    executemany):
+    deadline = _current_deadline()
+    if deadline is None:
+        return statement, parameters
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(deadline.retry_after)
+    if conn.dialect.name == "mysql" and \
+            statement.lstrip()[:6].upper() == "SELECT":
+        statement = "SELECT /*+ MAX_EXECUTION_TIME(%d) */%s" % (
+            max(1, int(remaining * 1000)), statement.lstrip()[6:])
+    conn.info["metaserv_deadline_watch"] = _watchdog.schedule(
+        deadline.expires, _cancel, conn, deadline)
+    return statement, parameters
+
+
+def _after_execute(conn, cursor, statement, parameters, context,
+                   executemany):
+    watch = conn.info.pop("metaserv_deadline_watch", None)
+    if watch is not None:
+        _watchdog.cancel(watch)
+
+
+def _handle_error(context):
+    conn = context.connection
+    watch = conn.info.pop("metaserv_deadline_watch", None) \
+        if conn is not None else None
+    if watch is not None:
+        _watchdog.cancel(watch)
+    deadline = _current_deadline()
+    if deadline is None:
+        return
+    code = getattr(context.original_exception, "args", (None,))[:1]
+    if deadline.cancelled or \
+            (context.engine.dialect.name == "mysql" and
+             code and code[0] in _MYSQL_INTERRUPTED):
+        raise DeadlineExceeded(deadline.retry_after)
+
+
+def _cancel(conn, deadline):
+    """Cancel the statement running on a connection (watchdog thread)."""
+    deadline.cancelled = True
+    dbapi_connection = conn.connection.connection
+    try:
+        if conn.dialect.name == "mysql":
+            thread_id = dbapi_connection.thread_id()
+            url = str(conn.engine.url)
+            killer_engine = _cancel_engines.get(url)
+            if killer_engine is None:
+                killer_engine = _cancel_engines.setdefault(
+                    url, create_engine(conn.engine.url, poolclass=NullPool))
+            with killer_engine.connect() as killer:
+                killer.execute("KILL QUERY %d" % thread_id)
+        elif hasattr(dbapi_connection, "interrupt"):
+            dbapi_connection.interrupt()
+    except Exception as e:
+        log.warning("Could not cancel statement past deadline: '%s'", e)
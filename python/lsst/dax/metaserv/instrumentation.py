@@ -0,0 +1,181 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Per-request SQL instrumentation.
+
+Engine event hooks record, for each request, the number of statements,
+the time spent executing them and the number of rows fetched. Views
+mark their serialization with :func:`serializing`. The figures are
+sent in a ``Server-Timing`` header, e.g.::
+
+    Server-Timing: db;dur=4.1;desc="3 statements, 120 rows",
+                   serialize;dur=1.3, total;dur=6.0
+
+and logged, as JSON, when the request ends. For streamed responses,
+the serialization time includes fetching the rows, and only the log
+has the final figures.
+
+The following config keys are supported:
+
+``metaserv_server_timing``
+    Sends the ``Server-Timing`` header, True by default.
+"""
+
+from contextlib import contextmanager
+import json
+import logging as log
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+
+class RequestStats(object):
+    """SQL and serialization figures of a request. Times are in
+    seconds."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.serialize_time = 0.0
+
+    def server_timing(self):
+        """Return the value of the ``Server-Timing`` header."""
+        return 'db;dur=%.1f;desc="%d statements, %d rows", ' \
+               'serialize;dur=%.1f, total;dur=%.1f' % (
+                   self.db_time * 1000, self.statements, self.rows,
+                   self.serialize_time * 1000,
+                   (time.time() - self.start) * 1000)
+
+    def as_dict(self):
+        return {"statements": self.statements,
+                "db_ms": round(self.db_time * 1000, 3),
+                "rows": self.rows,
+                "serialize_ms": round(self.serialize_time * 1000, 3),
+                "total_ms": round((time.time() - self.start) * 1000, 3)}
+
+
+def start_request_stats():
+    """Start recording the figures of the current request.
+
+    To be called from the first ``before_request`` hook.
+    """
+    install(current_app.config["default_engine"])
+    g.metaserv_stats = RequestStats()
+
+
+def current_stats():
+    """Return the :class:`RequestStats` of the current request, or
+    None."""
+    if not has_app_context():
+        return None
+    return g.get("metaserv_stats")
+
+
+@contextmanager
+def serializing():
+    """Count the time spent in the block as serialization time, less
+    the time of the statements executed within it (e.g. lazy loads)."""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    start = time.time()
+    db_time = stats.db_time
+    try:
+        yield
+    finally:
+        stats.serialize_time += \
+            time.time() - start - (stats.db_time - db_time)
+
+
+def add_server_timing(response):
+    """Add the ``Server-Timing`` header to a response."""
+    stats = current_stats()
+    if stats is not None and \
+            current_app.config.get("metaserv_server_timing", True):
+        response.headers["Server-Timing"] = stats.server_timing()
+    return response
+
+
+def log_request_stats():
+    """Log the figures of the current request, as a JSON object."""
+    stats = current_stats()
+    if stats is None:
+        return
+    record = {"method": request.method, "path": request.path,
+              "endpoint": request.endpoint}
+    record.update(stats.as_dict())
+    log.info("metaserv request %s", json.dumps(record, sort_keys=True))
+
+
+def install(engine):
+    """Record the statements of an engine in the request's figures."""
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+def _before_execute(conn, cursor, statement, parameters, context,
+                    executemany):
+    if current_stats() is not None:
+        conn.info["metaserv_statement_start"] = time.time()
+
+
+def _after_execute(conn, cursor, statement, parameters, context,
+                   executemany):
+    start = conn.info.pop("metaserv_statement_start", None)
+    stats = current_stats()
+    if start is None or stats is None:
+        return
+    stats.statements += 1
+    stats.db_time += time.time() - start
+    if context is not None and cursor.description is not None:
+        context.cursor = _CountingCursor(cursor, stats)
+
+
+class _CountingCursor(object):
+    """Wraps a DBAPI cursor to count the rows fetched from it."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
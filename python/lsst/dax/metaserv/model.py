@@ -1,4 +1,7 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, Text, DateTime
+from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, Text, \
+    DateTime, Index, case, func, select
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -42,7 +45,9 @@ class MSRepo(Base):
 
 class MSDatabase(Base):
     __tablename__ = 'MSDatabase'
-    __table_args__ = {'mysql_engine': 'InnoDB'}
+    __table_args__ = (
+        Index('IDX_MSDatabase_name', 'name', unique=True),
+        {'mysql_engine': 'InnoDB'})
     id = Column(Integer, primary_key=True)
     repo_id = Column(Integer, ForeignKey("MSRepo.id"), nullable=True)
     name = Column(String(128))
@@ -50,16 +55,21 @@ class MSDatabase(Base):
     conn_host = Column(String(128))
     conn_port = Column(Integer)
     schemas = relationship("MSDatabaseSchema", lazy="dynamic")
+    #: Scalar, so listings can resolve it with a join rather than one
+    #: query per database.
     default_schema = relationship(
         "MSDatabaseSchema",
         primaryjoin="and_(MSDatabase.id == MSDatabaseSchema.db_id, "
                     "MSDatabaseSchema.is_default_schema == True)",
-        lazy="dynamic")
+        uselist=False,
+        viewonly=True)
 
 
 class MSDatabaseSchema(Base):
     __tablename__ = 'MSDatabaseSchema'
-    __table_args__ = {'mysql_engine': 'InnoDB'}
+    __table_args__ = (
+        Index('IDX_MSDatabaseSchema_db_name', 'db_id', 'name', unique=True),
+        {'mysql_engine': 'InnoDB'})
     id = Column(Integer, primary_key=True)
     db_id = Column(Integer, ForeignKey("MSDatabase.id"))
     name = Column(String(128))
@@ -70,17 +80,30 @@ class MSDatabaseSchema(Base):
 
 class MSDatabaseTable(Base):
     __tablename__ = 'MSDatabaseTable'
-    __table_args__ = {'mysql_engine': 'InnoDB'}
+    __table_args__ = (
+        # Keyset pagination of the tables of a schema
+        Index('IDX_MSDatabaseTable_schema_id', 'schema_id', 'id'),
+        # Resolves table names, and covers listings of table names
+        # (InnoDB appends the id)
+        Index('IDX_MSDatabaseTable_schema_name', 'schema_id', 'name',
+              unique=True),
+        {'mysql_engine': 'InnoDB'})
     id = Column(Integer, primary_key=True)
     schema_id = Column(Integer, ForeignKey("MSDatabaseSchema.id"))
     name = Column(String(128))
     description = Column(Text)
-    columns = relationship("MSDatabaseColumn", lazy="dynamic")
+    #: Not dynamic, so listings can eager load columns for many tables
+    #: at once (see ``api_v1.tables``).
+    columns = relationship("MSDatabaseColumn",
+                           order_by="MSDatabaseColumn.ordinal")
 
 
 class MSDatabaseColumn(Base):
     __tablename__ = 'MSDatabaseColumn'
-    __table_args__ = {'mysql_engine': 'InnoDB'}
+    __table_args__ = (
+        # Keyset pagination of the columns of a table
+        Index('IDX_MSDatabaseColumn_table_id', 'table_id', 'ordinal'),
+        {'mysql_engine': 'InnoDB'})
     id = Column(Integer, primary_key=True)
     table_id = Column(Integer, ForeignKey("MSDatabaseTable.id"))
     name = Column(String(128))
@@ -94,13 +117,100 @@ class MSDatabaseColumn(Base):
     arraysize = Column(Integer)
 
 
+class MSGeneration(Base):
+    """Generation counter of the metadata, a single row.
+    It is bumped by the admin tools on every write, so readers caching
+    the metadata can tell when their copy is stale."""
+    __tablename__ = 'MSGeneration'
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+def get_generation(session):
+    """Return the current metadata generation, 0 if never bumped."""
+    generation = session.query(MSGeneration.generation).filter(
+        MSGeneration.id == 1).scalar()
+    return generation or 0
+
+
+def bump_generation(session, minimum=0):
+    """Increment the metadata generation as part of the session's
+    current transaction.
+
+    The increment is a single UPDATE, so concurrent writers serialize on
+    the row lock and each of them gets a distinct generation.
+
+    :param minimum: The new generation will be at least this value.
+    :returns: The new generation
+    """
+    incremented = MSGeneration.generation + 1
+    updated = session.query(MSGeneration).filter(
+        MSGeneration.id == 1).update(
+            # GREATEST(generation + 1, :minimum), portably
+            {"generation": case([(incremented < minimum, minimum)],
+                                else_=incremented)},
+            synchronize_session=False)
+    if not updated:
+        # Store created before init_db added the row
+        session.add(MSGeneration(id=1, generation=max(1, minimum)))
+    session.flush()
+    return get_generation(session)
+
+
 def init_db(engine):
     Base.metadata.create_all(engine, checkfirst=True)
+    # Create the generation row up front, so writers only ever update it
+    # and two first-time writers cannot both insert it.
+    with engine.begin() as conn:
+        if conn.execute(select([func.count()]).where(
+                MSGeneration.id == 1)).scalar() == 0:
+            conn.execute(MSGeneration.__table__.insert().values(
+                id=1, generation=0))
+
+
+def upgrade_db(engine):
+    """Bring an existing metadata store up to the current model, keeping
+    its content: create the missing tables (e.g. MSGeneration), the
+    missing indexes of existing tables, which create_all skips, and the
+    generation row. Safe to run repeatedly.
+
+    Creating a unique index fails if the store has duplicates it would
+    forbid, e.g. two tables of the same name in a schema.
+
+    :returns: The names of the indexes created
+    """
+    init_db(engine)
+    inspector = Inspector.from_engine(engine)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        existing = set(index["name"]
+                       for index in inspector.get_indexes(table.name))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    return created
 
 
 def _reinit_db(engine):
+    # Carry the generation over, so caches never mistake the new
+    # metadata for what they saw before the drop.
+    session = session_maker(engine)()
+    try:
+        generation = get_generation(session)
+    except SQLAlchemyError:
+        generation = 0
+    finally:
+        session.close()
     Base.metadata.drop_all(engine)
     init_db(engine)
+    session = session_maker(engine)()
+    try:
+        bump_generation(session, generation + 1)
+        session.commit()
+    finally:
+        session.close()
 
 
 def session_maker(engine):
@@ -0,0 +1,137 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+On-disk cache of parsed schema files.
+
+Entries are keyed by a digest of the file content and the parser
+version (see ``schema_utils.parse_schema``), so an unchanged file is
+never parsed twice and a parser change invalidates every entry. Each
+entry is a file holding the parsed structure, marshalled and
+compressed with zlib. The least recently used entries are removed once
+the cache grows over its size bound.
+
+Entries are written atomically, so several processes (e.g. the workers
+of ``schema_utils.parse_schemas``) can share a cache directory.
+"""
+
+import logging as log
+import marshal
+import os
+import tempfile
+import zlib
+
+_SUFFIX = ".m%d.z" % marshal.version
+
+
+class ParseCache(object):
+    """Cache of parsed schema files in a directory.
+
+    :param directory: Cache directory, created if needed
+    :param max_bytes: Size bound of the cache, 64 MiB by default
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + _SUFFIX)
+
+    def get(self, digest):
+        """Return the parsed structure stored for a digest, or None."""
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as entry:
+                data = entry.read()
+            schema = marshal.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError, zlib.error) as e:
+            log.warning("Dropping unreadable parse cache entry %s: %s",
+                        path, e)
+            self._remove(path)
+            return None
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return schema
+
+    def put(self, digest, schema):
+        """Store the parsed structure of a file, then evict entries if
+        the cache is over its size bound."""
+        os.makedirs(self.directory, exist_ok=True)
+        data = zlib.compress(marshal.dumps(schema))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as entry:
+                entry.write(data)
+            os.replace(tmp_path, self._path(digest))
+        except OSError:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is
+        within its size bound."""
+        entries = []
+        total = 0
+        try:
+            scanned = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in scanned:
+            if not entry.name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove every entry."""
+        max_bytes = self.max_bytes
+        self.max_bytes = -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("Could not remove parse cache entry %s: %s", path, e)
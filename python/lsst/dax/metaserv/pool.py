@@ -0,0 +1,127 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+Connection pool configuration and metrics.
+
+The pool is configured from an optional ``[pool]`` section of the same
+file the engine is created from, e.g.::
+
+    [pool]
+    pool_size = 10
+    max_overflow = 5
+    pool_recycle = 3600
+    pool_timeout = 10
+    pool_pre_ping = true
+"""
+
+import configparser
+import os
+import threading
+
+from sqlalchemy import create_engine
+
+#: Supported options of the [pool] section, and their types
+POOL_OPTIONS = {
+    "pool_size": int,
+    "max_overflow": int,
+    "pool_recycle": int,
+    "pool_timeout": float,
+    "pool_pre_ping": bool,
+}
+
+
+def read_pool_options(config_path, section="pool"):
+    """Read the pool options of a config file.
+
+    :param config_path: Path of the config file
+    :param section: Name of the section holding the options
+    :returns: Keyword arguments for ``create_engine``, empty if the
+    section does not exist.
+    """
+    parser = configparser.ConfigParser(allow_no_value=True, interpolation=None)
+    parser.read(os.path.expanduser(config_path))
+    if not parser.has_section(section):
+        return {}
+    options = {}
+    for name, value_type in POOL_OPTIONS.items():
+        if not parser.has_option(section, name):
+            continue
+        if value_type is bool:
+            options[name] = parser.getboolean(section, name)
+        else:
+            options[name] = value_type(parser.get(section, name))
+    return options
+
+
+def get_pooled_engine(config_path):
+    """Create an engine from a config file, with the pool options of its
+    ``[pool]`` section."""
+    from lsst.db.engineFactory import getEngineFromFile
+    engine = getEngineFromFile(config_path)
+    options = read_pool_options(config_path)
+    if options:
+        engine.dispose()
+        engine = create_engine(engine.url, **options)
+    return engine
+
+
+class PoolMetrics(object):
+    """Connection checkout statistics of an engine's pool.
+
+    The wait time of a checkout includes establishing a new connection
+    when the pool had none available. Timeouts count the checkouts that
+    failed because the pool was exhausted.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def as_dict(self):
+        """Return the statistics, with the current state of the pool."""
+        pool = self.engine.pool
+        metrics = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_total": self.wait_total,
+            "wait_max": self.wait_max,
+            "wait_mean": self.wait_total / self.checkouts
+            if self.checkouts else 0.0,
+        }
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            value = getattr(pool, name, None)
+            if value is not None:
+                metrics["pool_" + name] = value()
+        return metrics
@@ -20,6 +20,14 @@
 # the GNU General Public License along with this program.  If not,
 # see <http://www.lsstcorp.org/LegalNotices/>.
 
+from collections import namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import locale
+import logging as log
+import mmap
 import os
 import re
 import sys
@@ -48,7 +56,6 @@ This code was originally written for schema browser
 """
 
 _tableStart = re.compile(r'CREATE TABLE (\w+)')
-_tableEnd = re.compile(r"\)")
 _engineLine = re.compile(r'\)\s*(ENGINE|TYPE)\s*=[\s]*(\w+)\s*;')
 _columnLine = re.compile(r'\s*(\w+)\s+\w+')
 _idxCols = re.compile(r'\((.+?)\)')
@@ -56,9 +63,7 @@ _unitLine = re.compile(r'<unit>(.+)</unit>')
 _ucdLine = re.compile(r'<ucd>(.+)</ucd>')
 _descrLine = re.compile(r'<descr>(.+)</descr>')
 _descrStart = re.compile(r'<descr>(.+)')
-_descrMiddle = re.compile(r'--(.*)')
 _descrEnd = re.compile(r'--(.*)</descr>')
-_commentLine = re.compile(r'\s*--')
 _defaultLine = re.compile(r'\s+DEFAULT\s+(.+?)[\s,]')
 _size_parameter = re.compile(r'\((.+)\)')
 
@@ -75,10 +80,145 @@ MYSQL_TYPE_MAP = {
     'CHAR': "text"
     }
 
+#: Version of the parser output, part of the keys of the parse cache.
+#: To be increased whenever the structure returned by parse_schema
+#: changes.
+PARSER_VERSION = 3
 
-def parse_schema(schema_file_path):
-    """Do actual parsing. Returns the retrieved structure as a table. The
-    structure of the produced table:
+# Maps datatypes to one shared string object each
+_MYSQL_DATATYPES = {datatype: datatype
+                    for datatype in MYSQL_TYPE_MAP.values()}
+_INDEX_TYPES = {"PRIMARY": "PRIMARY KEY", "KEY": "-", "INDEX": "-",
+                "UNIQUE": "UNIQUE"}
+
+
+class _Missing(object):
+    """Value of the fields of a record which were not parsed."""
+
+    def __reduce__(self):
+        # Unpickled as the same object, e.g. in parse_schemas
+        return "_MISSING"
+
+    def __repr__(self):
+        return "_MISSING"
+
+_MISSING = _Missing()
+
+
+class _ParsedRecord(Mapping):
+    """Base of the parsed records: a fixed set of fields in __slots__,
+    read through the mapping interface as well as attributes. Fields
+    which were not parsed are absent from the mapping, like the keys of
+    the dicts returned by the original parser, so records compare equal
+    to those dicts."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not _MISSING
+
+    def __iter__(self):
+        return (key for key in self.__slots__
+                if getattr(self, key) is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def as_dict(self):
+        """Return a copy made of plain dicts and lists."""
+        return {key: [item.as_dict() for item in value]
+                if isinstance(value, list) else value
+                for key, value in self.items()}
+
+    @classmethod
+    def from_dict(cls, fields):
+        record = cls.__new__(cls)
+        for key in cls.__slots__:
+            value = fields.get(key, _MISSING)
+            if key in cls._lists and value is not _MISSING:
+                value = [cls._lists[key].from_dict(item) for item in value]
+            setattr(record, key, value)
+        return record
+
+    _lists = {}
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % item for item in self.items()))
+
+
+class ParsedColumn(_ParsedRecord):
+    """A column of a parsed table."""
+
+    __slots__ = ("name", "datatype", "arraysize", "nullable",
+                 "defaultValue", "description", "unit", "ucd")
+
+    def __init__(self, name, datatype, arraysize, nullable):
+        self.name = name
+        self.datatype = datatype
+        self.arraysize = arraysize
+        self.nullable = nullable
+        self.defaultValue = _MISSING
+        self.description = _MISSING
+        self.unit = _MISSING
+        self.ucd = _MISSING
+
+
+class ParsedIndex(_ParsedRecord):
+    """An index of a parsed table."""
+
+    __slots__ = ("type", "columns")
+
+    def __init__(self, type, columns):
+        self.type = type
+        self.columns = columns
+
+
+class ParsedTable(_ParsedRecord):
+    """A parsed table. Its name is the key of the table in the parsed
+    schema."""
+
+    __slots__ = ("description", "engine", "columns", "indexes")
+
+    _lists = {"columns": ParsedColumn, "indexes": ParsedIndex}
+
+    def __init__(self):
+        self.description = _MISSING
+        self.engine = _MISSING
+        self.columns = _MISSING
+        self.indexes = _MISSING
+
+
+def schema_as_dicts(schema):
+    """Return a parsed schema made of plain dicts and lists, e.g. to
+    serialize it."""
+    return {name: table.as_dict() if isinstance(table, _ParsedRecord)
+            else table for name, table in schema.items()}
+
+
+def schema_from_dicts(schema):
+    """Return the records of a schema made of plain dicts."""
+    return {name: ParsedTable.from_dict(table)
+            for name, table in schema.items()}
+
+
+def parse_schema(schema_file_path, cache=None):
+    """Do actual parsing. If a parse_cache.ParseCache is given, files
+    whose content was already parsed are read from it instead. Returns
+    the retrieved structure as a table. The structure of the produced
+    table:
 { <tableName1>: {
     'columns': [ { 'defaultValue': <value>,
                    'description': <column description>,
@@ -97,146 +237,280 @@ def parse_schema(schema_file_path):
   }
   # repeated for every table
 }
-"""
-
-    if not os.path.isfile(schema_file_path):
-        sys.stderr.write("Schema File '%s' does not exist\n" % schema_file_path)
-        sys.exit(1)
-
-    schema_file = open(schema_file_path, mode='r')
 
+    Tables, columns and indexes are ParsedTable, ParsedColumn and
+    ParsedIndex records, which read like the dicts above (see
+    schema_as_dicts for actual dicts).
+
+    Raises IOError if the file cannot be read, SchemaParseError if it
+    cannot be parsed. Errors writing to the cache are only logged.
+    """
+    try:
+        if cache is None:
+            with open(schema_file_path, mode='r') as schema_file:
+                return parse_schema_stream(schema_file)
+
+        with open(schema_file_path, mode='rb') as schema_file:
+            data = schema_file.read()
+        digest = hashlib.sha256(
+            b"%d:" % PARSER_VERSION + data).hexdigest()
+        cached = cache.get(digest)
+        if cached is not None:
+            return schema_from_dicts(cached)
+        # Decode the same way as open(mode='r') does
+        schema = parse_schema_stream(io.TextIOWrapper(io.BytesIO(data)))
+        try:
+            cache.put(digest, schema_as_dicts(schema))
+        except OSError as e:
+            # The cache is optional, the parse itself succeeded
+            log.warning("Could not write to parse cache %s: %s",
+                        cache.directory, e)
+        return schema
+    except SchemaParseError as e:
+        e.path = schema_file_path
+        raise
+
+
+def parse_schema_string(text):
+    """Parse a schema held in a string, see parse_schema."""
+    # newline=None: same newline handling as a file opened in text mode
+    return parse_schema_stream(io.StringIO(text, newline=None))
+
+
+def parse_schema_mmap(schema_file_path, encoding=None):
+    """Parse a schema file through a memory map, see parse_schema.
+
+    Lines are decoded one at a time from the mapped pages, so the file
+    content is never read into one buffer. Lines are split on "\\n"
+    and "\\r\\n" (but not on a lone "\\r").
+
+    :param encoding: Encoding of the file, the same as open() by default
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(schema_file_path, mode='rb') as schema_file:
+        if os.fstat(schema_file.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            return {}
+        mapped = mmap.mmap(schema_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_schema_stream(
+                _decoded_lines(mapped, encoding))
+        except SchemaParseError as e:
+            e.path = schema_file_path
+            raise
+        finally:
+            mapped.close()
+
+
+def _decoded_lines(mapped, encoding):
+    for line in iter(mapped.readline, b""):
+        if line.endswith(b"\r\n"):
+            line = line[:-2] + b"\n"
+        yield line.decode(encoding)
+
+
+class SchemaParseError(ValueError):
+    """A line of a schema could not be parsed.
+
+    :ivar lineno: Line number, starting at 1
+    :ivar line: Content of the line
+    :ivar path: Path of the file, if parsed from a file
+    """
+
+    def __init__(self, message, lineno, line, path=None):
+        ValueError.__init__(self, message, lineno, line, path)
+        self.message = message
+        self.lineno = lineno
+        self.line = line
+        self.path = path
+
+    def __str__(self):
+        return "%s:%d: %s: %r" % (self.path or "<schema>", self.lineno,
+                                  self.message, self.line)
+
+
+#: Result of parsing one file with parse_schemas: the parsed structure,
+#: or the exception raised while parsing it.
+ParseResult = namedtuple("ParseResult", ["path", "schema", "error"])
+
+
+def parse_schemas(schema_file_paths, max_workers=None, cache=None):
+    """Parse several schema files concurrently, in a process pool.
+
+    Results are returned in the order of the paths, whichever file is
+    parsed first. A file which cannot be parsed does not stop the
+    others: its ParseResult holds the exception, and no schema.
+
+    :param schema_file_paths: Paths of the schema files
+    :param max_workers: Number of processes, the number of CPUs by
+    default. With 1, or a single file, files are parsed in this process.
+    :param cache: Optional parse_cache.ParseCache, shared by the workers
+    :returns: A list of ParseResult, one per path.
+    """
+    schema_file_paths = list(schema_file_paths)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(schema_file_paths))
+    if max_workers <= 1:
+        return [_parse_schema_file(path, cache)
+                for path in schema_file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_parse_schema_file, schema_file_paths,
+                                 [cache] * len(schema_file_paths)))
+
+
+def _parse_schema_file(schema_file_path, cache=None):
+    try:
+        return ParseResult(schema_file_path,
+                           parse_schema(schema_file_path, cache), None)
+    except Exception as e:
+        return ParseResult(schema_file_path, None, e)
+
+
+def parse_schema_stream(lines):
+    """Parse a schema from an iterable of lines, e.g. an open file or
+    sys.stdin, see parse_schema. Raises SchemaParseError on lines that
+    cannot be parsed.
+
+    This is a single-pass parser: each line is classified once, from
+    cheap string tests, and at most one regular expression is run to
+    extract its content. The result is the same as the one of the
+    original line-by-line implementation, which is kept as a reference
+    for tests and benchmarks in tests/schema_regex_parser.py.
+    """
     table = None
     column = None
     column_description = None
     seen_description = False
     schema = {}
 
-    for line in schema_file:
-        m = _tableStart.search(line)
-        if m is not None and not _isCommentLine(line):
-            table_name = m.group(1)
-            table = schema.setdefault(table_name, {})
-            column = None
-        elif _tableEnd.match(line):
-            m = _engineLine.match(line)
-            if m is not None:
-                mysql_engine_name = m.group(2)
-                table["engine"] = mysql_engine_name
-            table = None
-        elif table is not None:  # process columns for given table
-            m = _columnLine.match(line)
-            if m is not None:
+    lineno = 0
+    line = None
+    try:
+        for lineno, line in enumerate(lines, 1):
+            stripped = line.lstrip()
+            is_comment = stripped.startswith("--")
+
+            if not is_comment and "CREATE TABLE" in line:
+                m = _tableStart.search(line)
+                if m is not None:
+                    table = schema.get(m.group(1))
+                    if table is None:
+                        table = schema[m.group(1)] = ParsedTable()
+                    column = None
+                    continue
+
+            if line.startswith(")"):
+                if "ENGINE" in line or "TYPE" in line:
+                    m = _engineLine.match(line)
+                    if m is not None:
+                        table.engine = m.group(2)
+                table = None
+                continue
+
+            if table is None or not stripped:
+                continue
+
+            if not is_comment:
+                m = _columnLine.match(line)
+                if m is None:
+                    continue
                 first_token = m.group(1)
-                if _isIndexDefinition(first_token):
-                    t = "-"
-                    if first_token == "PRIMARY":
-                        t = "PRIMARY KEY"
-                    elif first_token == "UNIQUE":
-                        t = "UNIQUE"
-                    idx_info = {
-                        "type": t,
-                        "columns": _retrIdxColumns(line)
-                        }
-                    table.setdefault("indexes", []).append(idx_info)
-                else:
+                if first_token in _INDEX_TYPES:
+                    if table.indexes is _MISSING:
+                        table.indexes = []
+                    table.indexes.append(ParsedIndex(
+                        _INDEX_TYPES[first_token], _retrIdxColumns(line)))
+                    continue
+                tokens = stripped.split()
+                datatype = tokens[1].rstrip(',')
+                arraysize = None
+                if "(" in datatype:
                     datatype, arraysize = _retrType(line)
-                    if datatype.lower() not in MYSQL_TYPE_MAP.values():
-                        datatype = MYSQL_TYPE_MAP[datatype.upper()]
-                    if datatype == "boolean":
-                        arraysize = None
-                    column = {
-                        "name": first_token,
-                        "datatype": datatype,
-                        "arraysize": arraysize,
-                        "nullable": not _retrIsNotNull(line),
-                    }
+                else:
+                    datatype = datatype.lower()
+                datatype = _MYSQL_DATATYPES.get(datatype) or \
+                    MYSQL_TYPE_MAP[datatype.upper()]
+                if datatype == "boolean":
+                    arraysize = None
+                column = ParsedColumn(first_token, datatype, arraysize,
+                                      'NOT NULL' not in line)
+                if "DEFAULT" in line:
                     dv = _retrDefaultValue(line)
                     if dv is not None:
-                        column["defaultValue"] = dv
-                    if "columns" not in table:
-                        table["columns"] = []
-                    table["columns"].append(column)
-            elif _isCommentLine(line):  # handle comments
-                if column is None:
-                    # table comment
-                    if _containsDescrTagStart(line):
-                        if _containsDescrTagEnd(line):
-                            table["description"] = _retrDescr(line)
-                        else:
-                            table["description"] = _retrDescrStart(line)
-                    elif "description" in table:
-                        if _containsDescrTagEnd(line):
-                            table["description"] += _retrDescrEnd(line)
-                        else:
-                            table["description"] += _retrDescrMid(line)
+                        column.defaultValue = dv
+                if table.columns is _MISSING:
+                    table.columns = []
+                table.columns.append(column)
+                continue
+
+            # comment line
+            has_descr_start = '<descr>' in line
+            has_descr_end = '</descr>' in line
+            if column is None:
+                # table comment
+                if has_descr_start:
+                    if has_descr_end:
+                        table.description = _retrDescr(line)
+                    else:
+                        table.description = _retrDescrStart(line)
+                elif table.description is not _MISSING:
+                    if has_descr_end:
+                        table.description += _retrDescrEnd(line)
+                    else:
+                        table.description += _commentText(line)
+                continue
+
+            # column comment
+            if has_descr_start:
+                if has_descr_end:
+                    column.description = _retrDescr(line)
                 else:
-                    # column comment
-                    if _containsDescrTagStart(line):
-                        if _containsDescrTagEnd(line):
-                            column["description"] = _retrDescr(line)
-                        else:
-                            column["description"] = _retrDescrStart(line)
-                            column_description = 1
-                    elif column_description:
-                        if _containsDescrTagEnd(line):
-                            more = _retrDescrEnd(line)
-                            if seen_description:
-                                more = more.strip() + "\n"
-                            column["description"] += more
-                            column_description = None
-                            seen_description = False
-                        else:
-                            more = _retrDescrMid(line)
-                            if not more.strip():
-                                seen_description = True
-                            # Add newlines if we've seen the description
-                            # and strip the left columns (yaml support)
-                            if seen_description:
-                                more = more.strip() + "\n"
-                            column["description"] += more
-
-                    # units
-                    if _isUnitLine(line):
-                        column["unit"] = _retrUnit(line)
-
-                    # ucds
-                    if _isUcdLine(line):
-                        column["ucd"] = _retrUcd(line)
-
-    schema_file.close()
-    return schema
-
-
-def _isIndexDefinition(c):
-    return c in ["PRIMARY", "KEY", "INDEX", "UNIQUE"]
-
-
-def _isCommentLine(fragment):
-    return _commentLine.match(fragment) is not None
-
-
-def _isUnitLine(fragment):
-    return _unitLine.search(fragment) is not None
-
-
-def _isUcdLine(fragment):
-    return _ucdLine.search(fragment) is not None
-
-
-def _retrUnit(fragment):
-    return _unitLine.search(fragment).group(1)
-
-
-def _retrUcd(fragment):
-    return _ucdLine.search(fragment).group(1)
-
+                    column.description = _retrDescrStart(line)
+                    column_description = 1
+            elif column_description:
+                if has_descr_end:
+                    more = _retrDescrEnd(line)
+                    if seen_description:
+                        more = more.strip() + "\n"
+                    column["description"] += more
+                    column_description = None
+                    seen_description = False
+                else:
+                    more = _commentText(line)
+                    if not more.strip():
+                        seen_description = True
+                    # Add newlines if we've seen the description
+                    # and strip the left columns (yaml support)
+                    if seen_description:
+                        more = more.strip() + "\n"
+                    column["description"] += more
+
+            if '<unit>' in line:
+                m = _unitLine.search(line)
+                if m is not None:
+                    column.unit = sys.intern(m.group(1))
+
+            if '<ucd>' in line:
+                m = _ucdLine.search(line)
+                if m is not None:
+                    column.ucd = sys.intern(m.group(1))
+    except UnicodeDecodeError:
+        raise
+    except (AttributeError, IndexError, KeyError, TypeError,
+            ValueError) as e:
+        raise SchemaParseError("%s: %s" % (type(e).__name__, e), lineno,
+                               line.rstrip("\n") if line else line) from e
 
-def _containsDescrTagStart(fragment):
-    return '<descr>' in fragment
+    return schema
 
 
-def _containsDescrTagEnd(fragment):
-    return '</descr>' in fragment
+def _commentText(line):
+    """Return the text after "--" on a comment line, without the line
+    end."""
+    text = line[line.index("--") + 2:]
+    end = text.find("\n")
+    return text if end < 0 else text[:end]
 
 
 def _retrDescr(fragment):
@@ -247,18 +521,10 @@ def _retrDescrStart(fragment):
     return _descrStart.search(fragment).group(1)
 
 
-def _retrDescrMid(fragment):
-    return _descrMiddle.search(fragment).group(1)
-
-
 def _retrDescrEnd(fragment):
     return _descrEnd.search(fragment).group(1).rstrip()
 
 
-def _retrIsNotNull(fragment):
-    return 'NOT NULL' in fragment
-
-
 def _retrType(fragment):
     datatype = fragment.split()[1].rstrip(',')
     size = None
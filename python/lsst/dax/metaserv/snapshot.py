@@ -0,0 +1,248 @@
+# LSST Data Management System
+# Copyright 2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+In-memory snapshot of the metadata store.
+
+The metadata only changes when the admin tools write to the store, and
+every such write bumps the generation counter (see
+:func:`.model.bump_generation`). A :class:`SnapshotCache` keeps a full
+copy of the databases, schemas, tables and columns, indexed by id and
+by name, and rebuilds it whenever the generation it was built from is
+no longer current.
+
+The entries mimic the attributes of the corresponding model classes,
+so they can be dumped with the schemas of :mod:`.api_model`.
+"""
+
+import logging as log
+import threading
+import time
+
+from .model import MSDatabase, MSDatabaseSchema, MSDatabaseTable, \
+    MSDatabaseColumn, get_generation
+
+
+def _lookup(by_id, by_name, identifier):
+    """Find an entry by id if ``identifier`` is made of ASCII digits, by
+    name otherwise (see ``api_v1._identified_by``)."""
+    if isinstance(identifier, int):
+        return by_id.get(identifier)
+    if identifier.isascii() and identifier.isdigit():
+        return by_id.get(int(identifier))
+    return by_name.get(identifier)
+
+
+class DatabaseEntry(object):
+    """Snapshot of a :class:`.model.MSDatabase`."""
+
+    def __init__(self, id, name, description, conn_host, conn_port):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.conn_host = conn_host
+        self.conn_port = conn_port
+        self.schemas = []
+        self.default_schema = None
+        self._schemas_by_id = {}
+        self._schemas_by_name = {}
+
+    def _add_schema(self, schema):
+        self.schemas.append(schema)
+        self._schemas_by_id[schema.id] = schema
+        self._schemas_by_name[schema.name] = schema
+        if schema.is_default_schema and self.default_schema is None:
+            self.default_schema = schema
+
+    def schema(self, schema_id):
+        """Return the schema with this name or id, None if not found."""
+        return _lookup(self._schemas_by_id, self._schemas_by_name, schema_id)
+
+
+class SchemaEntry(object):
+    """Snapshot of a :class:`.model.MSDatabaseSchema`."""
+
+    def __init__(self, id, db_id, name, description, is_default_schema):
+        self.id = id
+        self.db_id = db_id
+        self.name = name
+        self.description = description
+        self.is_default_schema = is_default_schema
+        self.tables = []
+        self._tables_by_id = {}
+        self._tables_by_name = {}
+
+    def _add_table(self, table):
+        self.tables.append(table)
+        self._tables_by_id[table.id] = table
+        self._tables_by_name[table.name] = table
+
+    def table(self, table_id):
+        """Return the table with this name or id, None if not found."""
+        return _lookup(self._tables_by_id, self._tables_by_name, table_id)
+
+
+class TableEntry(object):
+    """Snapshot of a :class:`.model.MSDatabaseTable`."""
+
+    def __init__(self, id, schema_id, name, description):
+        self.id = id
+        self.schema_id = schema_id
+        self.name = name
+        self.description = description
+        self.columns = []
+
+
+class ColumnEntry(object):
+    """Snapshot of a :class:`.model.MSDatabaseColumn`."""
+
+    def __init__(self, id, table_id, name, description, ordinal, ucd, unit,
+                 datatype, nullable, arraysize):
+        self.id = id
+        self.table_id = table_id
+        self.name = name
+        self.description = description
+        self.ordinal = ordinal
+        self.ucd = ucd
+        self.unit = unit
+        self.datatype = datatype
+        self.nullable = nullable
+        self.arraysize = arraysize
+
+
+class MetadataSnapshot(object):
+    """Immutable copy of the metadata store at a given generation."""
+
+    def __init__(self, generation, databases):
+        self.generation = generation
+        self.databases = databases
+        self._databases_by_id = {db.id: db for db in databases}
+        self._databases_by_name = {db.name: db for db in databases}
+
+    def database(self, db_id):
+        """Return the database with this name or id, None if not found."""
+        return _lookup(self._databases_by_id, self._databases_by_name, db_id)
+
+    def lookup_schema(self, db_id, schema_id=None):
+        """Return a ``(database, schema)`` tuple, or None if either is not
+        found. If ``schema_id`` is None, use the default schema."""
+        database = self.database(db_id)
+        if database is None:
+            return None
+        if schema_id is not None:
+            schema = database.schema(schema_id)
+        else:
+            schema = database.default_schema
+        if schema is None:
+            return None
+        return database, schema
+
+
+def load_snapshot(session):
+    """Read the whole metadata store, with one query per model class.
+
+    :param session: Session to query with
+    :returns: A :class:`MetadataSnapshot`
+    """
+    # Read the generation first, so a concurrent write leads to a
+    # rebuild on the next check rather than a stale snapshot.
+    generation = get_generation(session)
+
+    databases = [DatabaseEntry(*row) for row in session.query(
+        MSDatabase.id, MSDatabase.name, MSDatabase.description,
+        MSDatabase.conn_host, MSDatabase.conn_port).order_by(MSDatabase.id)]
+    databases_by_id = {db.id: db for db in databases}
+
+    schemas_by_id = {}
+    for row in session.query(
+            MSDatabaseSchema.id, MSDatabaseSchema.db_id,
+            MSDatabaseSchema.name, MSDatabaseSchema.description,
+            MSDatabaseSchema.is_default_schema).order_by(MSDatabaseSchema.id):
+        schema = SchemaEntry(*row)
+        database = databases_by_id.get(schema.db_id)
+        if database is not None:
+            database._add_schema(schema)
+            schemas_by_id[schema.id] = schema
+
+    tables_by_id = {}
+    for row in session.query(
+            MSDatabaseTable.id, MSDatabaseTable.schema_id,
+            MSDatabaseTable.name, MSDatabaseTable.description
+            ).order_by(MSDatabaseTable.id):
+        table = TableEntry(*row)
+        schema = schemas_by_id.get(table.schema_id)
+        if schema is not None:
+            schema._add_table(table)
+            tables_by_id[table.id] = table
+
+    for row in session.query(
+            MSDatabaseColumn.id, MSDatabaseColumn.table_id,
+            MSDatabaseColumn.name, MSDatabaseColumn.description,
+            MSDatabaseColumn.ordinal, MSDatabaseColumn.ucd,
+            MSDatabaseColumn.unit, MSDatabaseColumn.datatype,
+            MSDatabaseColumn.nullable, MSDatabaseColumn.arraysize
+            ).order_by(MSDatabaseColumn.table_id, MSDatabaseColumn.ordinal):
+        column = ColumnEntry(*row)
+        table = tables_by_id.get(column.table_id)
+        if table is not None:
+            table.columns.append(column)
+
+    return MetadataSnapshot(generation, databases)
+
+
+class SnapshotCache(object):
+    """Keeps a :class:`MetadataSnapshot` in sync with the store's
+    generation counter.
+
+    :param check_interval: Minimum number of seconds between two checks
+    of the generation counter. With the default of 0, it is checked on
+    every call to :meth:`get`.
+    """
+
+    def __init__(self, check_interval=0):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def get(self, session):
+        """Return a current snapshot, rebuilding it if needed.
+
+        :param session: Session used to check the generation and, if
+        needed, to rebuild the snapshot.
+        """
+        snapshot = self._snapshot
+        now = time.time()
+        if snapshot is not None and now - self._checked < self.check_interval:
+            return snapshot
+        generation = get_generation(session)
+        if snapshot is None or snapshot.generation != generation:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.generation != generation:
+                    log.info("Rebuilding metadata snapshot (generation %d)",
+                             generation)
+                    snapshot = self._snapshot = load_snapshot(session)
+        self._checked = now
+        return snapshot
+
+    def invalidate(self):
+        """Drop the current snapshot."""
+        self._snapshot = None
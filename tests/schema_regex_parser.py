@@ -0,0 +1,185 @@
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+The original implementation of schema_utils.parse_schema, kept as a
+reference: the single-pass parser must give the same results (see
+test_schema_to_meta.py), and benchmarks/bench_parse_schema.py compares
+their speed.
+"""
+
+import re
+
+from lsst.dax.metaserv.schema_utils import MYSQL_TYPE_MAP, _tableStart, \
+    _engineLine, _columnLine, _unitLine, _ucdLine, _retrDescr, \
+    _retrDescrStart, _retrDescrEnd, _retrType, _retrDefaultValue, \
+    _retrIdxColumns
+
+_tableEnd = re.compile(r"\)")
+_descrMiddle = re.compile(r'--(.*)')
+_commentLine = re.compile(r'\s*--')
+
+
+def parse_schema_regex(schema_file_path):
+    """Original implementation of parse_schema, running every regular
+    expression on every line. Returns nested dicts."""
+
+    schema_file = open(schema_file_path, mode='r')
+
+    table = None
+    column = None
+    column_description = None
+    seen_description = False
+    schema = {}
+
+    for line in schema_file:
+        m = _tableStart.search(line)
+        if m is not None and not _isCommentLine(line):
+            table_name = m.group(1)
+            table = schema.setdefault(table_name, {})
+            column = None
+        elif _tableEnd.match(line):
+            m = _engineLine.match(line)
+            if m is not None:
+                mysql_engine_name = m.group(2)
+                table["engine"] = mysql_engine_name
+            table = None
+        elif table is not None:  # process columns for given table
+            m = _columnLine.match(line)
+            if m is not None:
+                first_token = m.group(1)
+                if _isIndexDefinition(first_token):
+                    t = "-"
+                    if first_token == "PRIMARY":
+                        t = "PRIMARY KEY"
+                    elif first_token == "UNIQUE":
+                        t = "UNIQUE"
+                    idx_info = {
+                        "type": t,
+                        "columns": _retrIdxColumns(line)
+                        }
+                    table.setdefault("indexes", []).append(idx_info)
+                else:
+                    datatype, arraysize = _retrType(line)
+                    if datatype.lower() not in MYSQL_TYPE_MAP.values():
+                        datatype = MYSQL_TYPE_MAP[datatype.upper()]
+                    if datatype == "boolean":
+                        arraysize = None
+                    column = {
+                        "name": first_token,
+                        "datatype": datatype,
+                        "arraysize": arraysize,
+                        "nullable": not _retrIsNotNull(line),
+                    }
+                    dv = _retrDefaultValue(line)
+                    if dv is not None:
+                        column["defaultValue"] = dv
+                    if "columns" not in table:
+                        table["columns"] = []
+                    table["columns"].append(column)
+            elif _isCommentLine(line):  # handle comments
+                if column is None:
+                    # table comment
+                    if _containsDescrTagStart(line):
+                        if _containsDescrTagEnd(line):
+                            table["description"] = _retrDescr(line)
+                        else:
+                            table["description"] = _retrDescrStart(line)
+                    elif "description" in table:
+                        if _containsDescrTagEnd(line):
+                            table["description"] += _retrDescrEnd(line)
+                        else:
+                            table["description"] += _retrDescrMid(line)
+                else:
+                    # column comment
+                    if _containsDescrTagStart(line):
+                        if _containsDescrTagEnd(line):
+                            column["description"] = _retrDescr(line)
+                        else:
+                            column["description"] = _retrDescrStart(line)
+                            column_description = 1
+                    elif column_description:
+                        if _containsDescrTagEnd(line):
+                            more = _retrDescrEnd(line)
+                            if seen_description:
+                                more = more.strip() + "\n"
+                            column["description"] += more
+                            column_description = None
+                            seen_description = False
+                        else:
+                            more = _retrDescrMid(line)
+                            if not more.strip():
+                                seen_description = True
+                            # Add newlines if we've seen the description
+                            # and strip the left columns (yaml support)
+                            if seen_description:
+                                more = more.strip() + "\n"
+                            column["description"] += more
+
+                    # units
+                    if _isUnitLine(line):
+                        column["unit"] = _retrUnit(line)
+
+                    # ucds
+                    if _isUcdLine(line):
+                        column["ucd"] = _retrUcd(line)
+
+    schema_file.close()
+    return schema
+
+
+def _isIndexDefinition(c):
+    return c in ["PRIMARY", "KEY", "INDEX", "UNIQUE"]
+
+
+def _isCommentLine(fragment):
+    return _commentLine.match(fragment) is not None
+
+
+def _isUnitLine(fragment):
+    return _unitLine.search(fragment) is not None
+
+
+def _isUcdLine(fragment):
+    return _ucdLine.search(fragment) is not None
+
+
+def _retrUnit(fragment):
+    return _unitLine.search(fragment).group(1)
+
+
+def _retrUcd(fragment):
+    return _ucdLine.search(fragment).group(1)
+
+
+def _containsDescrTagStart(fragment):
+    return '<descr>' in fragment
+
+
+def _containsDescrTagEnd(fragment):
+    return '</descr>' in fragment
+
+
+def _retrDescrMid(fragment):
+    return _descrMiddle.search(fragment).group(1)
+
+
+def _retrIsNotNull(fragment):
+    return 'NOT NULL' in fragment
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the admin operations, run against an in-memory
+SQLite metadata store.
+"""
+
+# standard library
+import json
+import logging as log
+import os
+import shutil
+import tempfile
+import unittest
+
+# third party
+import click
+from sqlalchemy import create_engine, event
+
+# local
+from lsst.dax.metaserv.admin_cli import Operations, CliConfig, add_dbs, \
+    update_db, SchemaDiff, _catalog_type, _diff_schema, _format_schema_diff
+from lsst.dax.metaserv.model import init_db, session_maker, MSUser, \
+    MSDatabase, MSDatabaseTable, MSDatabaseColumn, get_generation
+from lsst.dax.metaserv.schema_utils import parse_schema_string
+
+DDL = """
+CREATE TABLE Object
+    -- <descr>Objects.</descr>
+(
+    objectId BIGINT NOT NULL,
+        -- <descr>Identifier.</descr>
+        -- <ucd>meta.id</ucd>
+    ra DOUBLE,
+        -- <unit>deg</unit>
+    name VARCHAR(32),
+    PRIMARY KEY (objectId)
+) ENGINE=MyISAM;
+
+CREATE TABLE Source
+(
+    sourceId BIGINT NOT NULL,
+    objectId BIGINT
+) ENGINE=MyISAM;
+"""
+
+
+class TestOperations(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        init_db(engine)
+        self.session = session_maker(engine)()
+        user = MSUser(first_name="A", last_name="User",
+                      email="user@example.com")
+        self.session.add(user)
+        self.session.flush()
+        repo = Operations.add_repo(self.session, "db", "Test", user, "L2",
+                                   "DR1")
+        db = Operations.add_database(self.session, repo, "db", "localhost",
+                                     3306)
+        self.schema = Operations.add_schema(self.session, db, "db_schema")
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_add_tables_and_columns(self):
+        batch_size = Operations.BULK_BATCH_SIZE
+        Operations.BULK_BATCH_SIZE = 2
+        try:
+            Operations.add_tables_and_columns(self.session, self.schema,
+                                              parse_schema_string(DDL))
+        finally:
+            Operations.BULK_BATCH_SIZE = batch_size
+        self.session.commit()
+
+        tables = {table.name: table for table in
+                  self.session.query(MSDatabaseTable).filter(
+                      MSDatabaseTable.schema_id == self.schema.id)}
+        self.assertEqual(sorted(tables), ["Object", "Source"])
+        self.assertEqual(tables["Object"].description, "Objects.")
+        self.assertEqual(tables["Source"].description, "")
+        columns = tables["Object"].columns
+        self.assertEqual([(c.name, c.ordinal) for c in columns],
+                         [("objectId", 0), ("ra", 1), ("name", 2)])
+        self.assertEqual(columns[0].ucd, "meta.id")
+        self.assertFalse(columns[0].nullable)
+        self.assertEqual(columns[1].unit, "deg")
+        self.assertEqual(columns[2].datatype, "text")
+        self.assertEqual(columns[2].arraysize, 32)
+        self.assertEqual([c.name for c in tables["Source"].columns],
+                         ["sourceId", "objectId"])
+        self.assertEqual(self.session.query(MSDatabaseColumn).count(), 5)
+
+    def test_update_tables_and_columns(self):
+        Operations.add_tables_and_columns(self.session, self.schema,
+                                          parse_schema_string(DDL))
+        self.session.commit()
+        ids = dict(self.session.query(
+            MSDatabaseColumn.name, MSDatabaseColumn.id).join(
+                MSDatabaseTable).filter(
+                    MSDatabaseTable.schema_id == self.schema.id,
+                    MSDatabaseTable.name == "Object"))
+        statements = []
+        event.listen(self.session.bind, "before_cursor_execute",
+                     lambda *args: statements.append(1))
+        counts = Operations.update_tables_and_columns(
+            self.session, self.schema, parse_schema_string(DDL))
+        self.assertFalse(any(counts.values()))
+        self.assertEqual(len(statements), 2)
+
+        # Object: ra's unit changes, name is dropped, dec is added;
+        # Source is dropped, Filter is added
+        ddl = DDL.replace("<unit>deg</unit>", "<unit>rad</unit>") \
+            .replace("    name VARCHAR(32),\n", "    dec DOUBLE,\n")
+        ddl = ddl[:ddl.index("CREATE TABLE Source")] + \
+            "CREATE TABLE Filter\n(\n    filterId INT\n) ENGINE=MyISAM;\n"
+        counts = Operations.update_tables_and_columns(
+            self.session, self.schema, parse_schema_string(ddl))
+        self.session.commit()
+        self.assertEqual(counts, {
+            "tables_added": 1, "tables_updated": 0, "tables_deleted": 1,
+            "columns_added": 2, "columns_updated": 1, "columns_deleted": 3})
+
+        self.session.expire_all()
+        tables = {table.name: table for table in
+                  self.session.query(MSDatabaseTable).filter(
+                      MSDatabaseTable.schema_id == self.schema.id)}
+        self.assertEqual(sorted(tables), ["Filter", "Object"])
+        columns = tables["Object"].columns
+        self.assertEqual([(c.name, c.ordinal) for c in columns],
+                         [("objectId", 0), ("ra", 1), ("dec", 2)])
+        self.assertEqual(columns[0].id, ids["objectId"])
+        self.assertEqual(columns[1].id, ids["ra"])
+        self.assertEqual(columns[1].unit, "rad")
+        self.assertEqual([c.name for c in tables["Filter"].columns],
+                         ["filterId"])
+        self.assertEqual(self.session.query(MSDatabaseColumn).count(), 4)
+
+
+class TestAddDbs(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        engine = create_engine("sqlite://")
+        init_db(engine)
+        self.config = CliConfig.__new__(CliConfig)
+        self.config.engine = engine
+        self.config.Session = session_maker(engine)
+        self.config.log = log.getLogger("lsst.metaserv.admin")
+        self.config.parse_cache = None
+        session = self.config.Session()
+        session.add(MSUser(first_name="A", last_name="User",
+                           email="user@example.com"))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _add_dbs(self, databases):
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path, "w") as manifest:
+            json.dump({"defaults": {"host": "localhost", "port": 3306,
+                                    "owner": "user@example.com",
+                                    "schema_version": "1.0"},
+                       "databases": databases}, manifest)
+        with click.Context(add_dbs, obj=self.config) as ctx:
+            ctx.invoke(add_dbs, manifest=path, jobs=1)
+
+    def _entry(self, db_name, schema_file="db.sql"):
+        return {"schema_file": schema_file, "db_name": db_name,
+                "schema_name": db_name, "schema_description": db_name}
+
+    def test_add_dbs(self):
+        with open(os.path.join(self.directory, "db.sql"), "w") as ddl:
+            ddl.write(DDL)
+        # db1 is listed twice: the second entry fails and is rolled back
+        with self.assertRaises(click.exceptions.Exit):
+            self._add_dbs([self._entry("db1"), self._entry("db2"),
+                           self._entry("db1"),
+                           self._entry("db3", "missing.sql")])
+        session = self.config.Session()
+        self.assertEqual(sorted(name for name, in session.query(
+            MSDatabase.name)), ["db1", "db2"])
+        self.assertEqual(session.query(MSDatabaseColumn).count(), 10)
+        self.assertEqual(get_generation(session), 2)
+        session.close()
+
+    def _update_db(self, path, dry_run):
+        with click.Context(update_db, obj=self.config) as ctx:
+            return ctx.invoke(update_db, schema_file=path, db_name="db1",
+                              schema_name=None, dry_run=dry_run)
+
+    def test_update_db(self):
+        path = os.path.join(self.directory, "db.sql")
+        with open(path, "w") as ddl:
+            ddl.write(DDL)
+        self._add_dbs([self._entry("db1")])
+        with open(path, "w") as ddl:
+            ddl.write(DDL.replace("<unit>deg</unit>", "<unit>rad</unit>"))
+        self.assertEqual(self._update_db(path, True)["columns_updated"], 1)
+        session = self.config.Session()
+        self.assertEqual(get_generation(session), 1)
+        session.close()
+        self.assertEqual(self._update_db(path, False)["columns_updated"], 1)
+        session = self.config.Session()
+        self.assertEqual(get_generation(session), 2)
+        self.assertEqual(session.query(MSDatabaseColumn.unit).filter(
+            MSDatabaseColumn.name == "ra").scalar(), "rad")
+        session.close()
+        # Nothing left to change
+        self.assertFalse(any(self._update_db(path, False).values()))
+
+    def test_bad_manifest(self):
+        entry = self._entry("db1")
+        del entry["db_name"]
+        with self.assertRaises(click.ClickException):
+            self._add_dbs([entry])
+
+
+class TestSchemaDiff(unittest.TestCase):
+
+    def test_diff_schema(self):
+        # As _catalog_columns would read it from information_schema
+        catalog = {
+            "Object": {"objectId": _catalog_type("bigint", None),
+                       "ra": _catalog_type("float", None),
+                       "name": _catalog_type("varchar", 64),
+                       "flags": _catalog_type("int", None)},
+            "Other": {"otherId": _catalog_type("int", None)},
+        }
+        diff = _diff_schema(parse_schema_string(DDL), catalog)
+        self.assertEqual(diff, SchemaDiff(
+            missing_tables=["Source"],
+            extra_tables=["Other"],
+            missing_columns=[],
+            extra_columns=[("Object", "flags")],
+            type_mismatches=[("Object", "ra", ("double", None),
+                              ("float", None)),
+                             ("Object", "name", ("text", 32),
+                              ("text", 64))]))
+        self.assertEqual(_format_schema_diff(diff), [
+            "Table 'Source' not found in db, present in ascii file",
+            "Table 'Other' found in db only",
+            "Column 'Object.flags' not found in ascii file, present in db",
+            "Column 'Object.ra' is double in ascii file, float in db",
+            "Column 'Object.name' is text(32) in ascii file, text(64) in db"])
+
+        catalog["Object"]["ra"] = _catalog_type("double", None)
+        catalog["Object"]["name"] = _catalog_type("varchar", 32)
+        del catalog["Object"]["flags"]
+        catalog["Source"] = {"sourceId": _catalog_type("bigint", None)}
+        diff = _diff_schema(parse_schema_string(DDL), catalog)
+        self.assertEqual(diff.missing_columns, [("Source", "objectId")])
+        self.assertEqual(diff.type_mismatches, [])
+
+    def test_diff_schema_widths(self):
+        # Display widths and float precisions are not lengths, and the
+        # catalog has no CHARACTER_MAXIMUM_LENGTH for them
+        ddl = """
+CREATE TABLE T
+(
+    a BIGINT(20) NOT NULL,
+    b TINYINT(1),
+    c FLOAT(0),
+    d INTEGER(11),
+    e CHAR(8),
+    f BINARY(16)
+) ENGINE=MyISAM;
+"""
+        catalog = {"T": {"a": _catalog_type("bigint", None),
+                         "b": _catalog_type("tinyint", None),
+                         "c": _catalog_type("float", None),
+                         "d": _catalog_type("int", None),
+                         "e": _catalog_type("char", 8),
+                         "f": _catalog_type("binary", 16)}}
+        self.assertEqual(_diff_schema(parse_schema_string(ddl), catalog),
+                         SchemaDiff([], [], [], [], []))
+        catalog["T"]["e"] = _catalog_type("char", 4)
+        catalog["T"]["f"] = _catalog_type("binary", 32)
+        self.assertEqual(
+            _diff_schema(parse_schema_string(ddl), catalog).type_mismatches,
+            [("T", "e", ("text", 8), ("text", 4)),
+             ("T", "f", ("binary", 16), ("binary", 32))])
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
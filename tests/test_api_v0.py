@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the streamed results of the v0 RESTful API, run
+against a SQLite database with the Repo and DbRepo tables it queries.
+"""
+
+# standard library
+import gzip
+import json
+import logging as log
+import os
+import shutil
+import tempfile
+import unittest
+
+# third party
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+
+# local
+from lsst.dax.metaserv import api_v0
+
+N_DATABASES = 200
+
+
+class TestApiV0(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory, "meta.db"),
+            poolclass=QueuePool, pool_size=1, max_overflow=0,
+            pool_timeout=1,
+            connect_args={"check_same_thread": False})
+        self.engine.execute("CREATE TABLE Repo (repoId INTEGER PRIMARY KEY, "
+                            "lsstLevel TEXT, repoType TEXT)")
+        self.engine.execute("CREATE TABLE DbRepo (dbRepoId INTEGER, "
+                            "dbName TEXT)")
+        for i in range(1, N_DATABASES + 1):
+            self.engine.execute("INSERT INTO Repo VALUES (?, 'L2', 'db')", i)
+            self.engine.execute("INSERT INTO DbRepo VALUES (?, ?)",
+                                i, "database_%d" % i)
+        self.app = Flask(__name__)
+        self.app.config["default_engine"] = self.engine
+        self.app.register_blueprint(api_v0.metaREST, url_prefix='/meta/v0')
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def _expected(self):
+        rows = self.engine.execute(
+            "SELECT dbName FROM Repo JOIN DbRepo on (repoId=dbRepoId) "
+            "WHERE lsstLevel = 'L2'")
+        return json.dumps(api_v0._vector([list(row) for row in rows]))
+
+    def test_streamed_results(self):
+        response = self.client.get("/meta/v0/db/L2",
+                                   headers={"Accept": "application/json"})
+        self.assertTrue(response.is_streamed)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.get_data(as_text=True), self._expected())
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    def test_streamed_results_compressed(self):
+        response = self.client.get("/meta/v0/db/L2",
+                                   headers={"Accept": "application/json",
+                                            "Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.get_data()).decode("utf-8"),
+                         self._expected())
+
+    def test_connection_released_if_not_read(self):
+        # Keep the connection referenced, so it is not released by
+        # garbage collection
+        connections = []
+        event.listen(self.engine, "engine_connect",
+                     lambda connection, branch: connections.append(connection))
+        with self.app.test_request_context("/meta/v0/db/L2"):
+            response = api_v0._streamedResultsOf(
+                self.engine, text("SELECT dbName FROM DbRepo"), {})
+            self.assertEqual(self.engine.pool.checkedout(), 1)
+            # Closed before the generator is started
+            response.close()
+            self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    def test_error_while_streaming(self):
+        # Not serializable to JSON
+        self.engine.execute("UPDATE DbRepo SET dbName = X'00' "
+                            "WHERE dbRepoId = 2")
+        with self.app.test_request_context("/meta/v0/db/L2"):
+            response = api_v0._streamedResultsOf(
+                self.engine, text("SELECT dbName FROM DbRepo "
+                                  "ORDER BY dbRepoId"), {})
+            with self.assertLogs(level="ERROR") as logs:
+                body = response.get_data(as_text=True)
+        self.assertEqual(body, '{"results": [["database_1"]')
+        self.assertIn("/meta/v0/db/L2", logs.output[0])
+        self.assertIn("TypeError", logs.output[0])
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
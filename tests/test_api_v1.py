@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the v1 RESTful API, run against an in-memory
+SQLite metadata store.
+"""
+
+# standard library
+import gzip
+import json
+import logging as log
+import os
+import tempfile
+import time
+import unittest
+
+# third party
+from flask import Flask, request
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool, QueuePool
+
+# local
+from lsst.dax.metaserv import api_v1
+from lsst.dax.metaserv.api_model import Database, DatabaseSchema, \
+    DatabaseTable, compiled_schema
+from lsst.dax.metaserv.compression import CompressionCache
+from lsst.dax.metaserv.deadline import DeadlineExceeded, Watchdog, \
+    start_request_deadline
+from lsst.dax.metaserv.pool import read_pool_options
+from lsst.dax.metaserv.model import init_db, session_maker, MSDatabase, \
+    MSDatabaseSchema, MSDatabaseTable, MSDatabaseColumn, bump_generation
+
+
+def _make_app():
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    init_db(engine)
+    app = Flask(__name__)
+    app.config["default_engine"] = engine
+    app.register_blueprint(api_v1.metaserv_api_v1, url_prefix='/meta/v1')
+    return app
+
+
+def _add_database(app, db_name, n_tables, n_columns=3):
+    session = session_maker(app.config["default_engine"])()
+    db = MSDatabase(name=db_name, conn_host="localhost", conn_port=3306)
+    session.add(db)
+    session.flush()
+    schema = MSDatabaseSchema(db_id=db.id, name=db_name + "_schema",
+                              is_default_schema=True)
+    session.add(schema)
+    session.flush()
+    for i in range(n_tables):
+        table = MSDatabaseTable(schema_id=schema.id, name="t%d" % i,
+                                description="Table %d" % i)
+        session.add(table)
+        session.flush()
+        for j in range(n_columns):
+            session.add(MSDatabaseColumn(table_id=table.id, name="c%d" % j,
+                                         ordinal=j, datatype="int",
+                                         nullable=True))
+    bump_generation(session)
+    session.commit()
+    session.close()
+
+
+class _StatementCounter(object):
+    """Count the SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _count(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+class TestApiV1(unittest.TestCase):
+
+    def setUp(self):
+        self.app = _make_app()
+        self.engine = self.app.config["default_engine"]
+        self.client = self.app.test_client()
+
+    def _count_get(self, url):
+        with _StatementCounter(self.engine) as counter:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return counter.count, json.loads(response.get_data(as_text=True))
+
+    def test_databases_statement_count_is_flat(self):
+        _add_database(self.app, "db0", 1)
+        small_count, small = self._count_get("/meta/v1/db/")
+        for i in range(1, 20):
+            _add_database(self.app, "db%d" % i, 1)
+        large_count, large = self._count_get("/meta/v1/db/")
+        self.assertEqual(len(large["results"]), 20)
+        self.assertEqual(large["results"][5]["default_schema"], "db5_schema")
+        self.assertEqual(small_count, large_count)
+
+    def test_tables(self):
+        _add_database(self.app, "db1", 2)
+        _, data = self._count_get("/meta/v1/db/db1/tables/")
+        tables = data["results"]["tables"]
+        self.assertEqual(data["results"]["schema"]["name"], "db1_schema")
+        self.assertEqual([t["name"] for t in tables], ["t0", "t1"])
+        self.assertEqual([c["name"] for c in tables[0]["columns"]],
+                         ["c0", "c1", "c2"])
+
+    def test_tables_statement_count_is_flat(self):
+        _add_database(self.app, "small", 2)
+        _add_database(self.app, "large", 40)
+        small_count, small = self._count_get("/meta/v1/db/small/tables/")
+        large_count, large = self._count_get("/meta/v1/db/large/tables/")
+        self.assertEqual(len(small["results"]["tables"]), 2)
+        self.assertEqual(len(large["results"]["tables"]), 40)
+        self.assertEqual(small_count, large_count)
+        # generation (for the ETag), database and schema, tables, columns
+        self.assertLessEqual(large_count, 4)
+
+    def test_resolve_ids_and_names(self):
+        _add_database(self.app, "db1", 1)
+        _add_database(self.app, "db2", 3)
+        _, by_name = self._count_get("/meta/v1/db/db2/db2_schema/tables/t2/")
+        _, by_id = self._count_get("/meta/v1/db/2/2/tables/%d/" %
+                                   by_name["result:"]["id"])
+        self.assertEqual(by_name["result:"]["name"], "t2")
+        self.assertEqual(by_id["result:"]["name"], "t2")
+        response = self.client.get("/meta/v1/db/db2/1/tables/t2/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_tables_not_found(self):
+        response = self.client.get("/meta/v1/db/nope/tables/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_ascii_digits_not_found(self):
+        _add_database(self.app, "db1", 1)
+        for url in ("/meta/v1/db/%C2%B2/", "/meta/v1/db/%C2%B2/tables/",
+                    "/meta/v1/db/db1/tables/%C2%B2/"):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def _walk(self, url):
+        """Follow the ``next`` links from url, return all pages."""
+        pages = []
+        while url is not None:
+            _, data = self._count_get(url)
+            pages.append(data)
+            url = data.get("next")
+        return pages
+
+    def test_pagination(self):
+        for i in range(5):
+            _add_database(self.app, "db%d" % i, 7 if i == 0 else 1,
+                          n_columns=4)
+        pages = self._walk("/meta/v1/db/?limit=2")
+        self.assertEqual([len(page["results"]) for page in pages], [2, 2, 1])
+        self.assertEqual([db["name"] for page in pages
+                          for db in page["results"]],
+                         ["db%d" % i for i in range(5)])
+
+        pages = self._walk("/meta/v1/db/db0/tables/?limit=3")
+        self.assertEqual([t["name"] for page in pages
+                          for t in page["results"]["tables"]],
+                         ["t%d" % i for i in range(7)])
+        self.assertEqual(len(pages), 3)
+
+        pages = self._walk("/meta/v1/db/db0/tables/t2/columns/?limit=3")
+        self.assertEqual([c["name"] for page in pages
+                          for c in page["results"]],
+                         ["c0", "c1", "c2", "c3"])
+        self.assertEqual(len(pages), 2)
+
+        response = self.client.get("/meta/v1/db/?limit=x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_projection(self):
+        _add_database(self.app, "db1", 3)
+        self._count_get("/meta/v1/db/db1/tables/")
+        url = "/meta/v1/db/db1/tables/?fields=name"
+        with _StatementCounter(self.engine) as counter:
+            data = json.loads(self.client.get(url).get_data(as_text=True))
+        self.assertEqual(data["results"]["tables"],
+                         [{"name": "t0"}, {"name": "t1"}, {"name": "t2"}])
+        # The columns are not read at all
+        self.assertFalse([statement for statement in counter.statements
+                          if "MSDatabaseColumn" in statement])
+
+        _, data = self._count_get("/meta/v1/db/db1/tables/t1/?columns=false")
+        self.assertEqual(sorted(data["result:"]),
+                         ["description", "id", "name", "url"])
+
+        _, data = self._count_get("/meta/v1/db/?fields=name,default_schema")
+        self.assertEqual(data["results"],
+                         [{"name": "db1", "default_schema": "db1_schema"}])
+
+        response = self.client.get("/meta/v1/db/?fields=name,nope")
+        self.assertEqual(response.status_code, 400)
+
+    def test_compiled_schema(self):
+        _add_database(self.app, "db1", 3)
+        _add_database(self.app, "db2", 1)
+        session = session_maker(self.engine)()
+        databases = session.query(MSDatabase).all()
+        tables = session.query(MSDatabaseTable).all()
+
+        def check(schema_class, objs, **kwargs):
+            expected = schema_class(many=True, **kwargs).dump(objs).data
+            actual = compiled_schema(schema_class, **kwargs).dump(objs,
+                                                                  many=True)
+            self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+        with self.app.test_request_context("/meta/v1/db/"):
+            check(Database, databases)
+            check(Database, databases, only=("url", "name"))
+        with self.app.test_request_context("/meta/v1/db/db1/"):
+            check(Database, databases[:1])
+        with self.app.test_request_context("/meta/v1/db/db1/s/tables/"):
+            request.database = databases[0]
+            check(DatabaseSchema, databases[0].schemas.all())
+            check(DatabaseTable, tables)
+            check(DatabaseTable, tables, exclude=("columns",))
+        session.close()
+
+    def test_stream(self):
+        _add_database(self.app, "db1", 5)
+        _, expected = self._count_get("/meta/v1/db/db1/tables/")
+        response = self.client.get("/meta/v1/db/db1/tables/?stream=true")
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(json.loads(response.get_data(as_text=True)),
+                         expected)
+        response = self.client.get("/meta/v1/db/db1/tables/?stream=true",
+                                   headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        body = gzip.decompress(response.get_data())
+        self.assertEqual(json.loads(body.decode("utf-8")), expected)
+
+        self.app.config["metaserv_stream"] = True
+        pages = self._walk("/meta/v1/db/db1/tables/?limit=2&columns=false")
+        self.assertEqual([[t["name"] for t in page["results"]["tables"]]
+                          for page in pages],
+                         [["t0", "t1"], ["t2", "t3"], ["t4"]])
+        self.assertNotIn("columns", pages[0]["results"]["tables"][0])
+
+        _, data = self._count_get("/meta/v1/db/db1/dump/")
+        self.assertEqual(data["result"]["database"]["name"], "db1")
+        self.assertEqual(data["result"]["tables"],
+                         expected["results"]["tables"])
+
+    def test_compression(self):
+        _add_database(self.app, "db1", 20)
+        url = "/meta/v1/db/db1/tables/"
+        _, expected = self._count_get(url)
+        headers = {"Accept-Encoding": "gzip"}
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        body = gzip.decompress(response.get_data())
+        self.assertEqual(json.loads(body.decode("utf-8")), expected)
+        # Served from the compression cache, without querying the tables
+        with _StatementCounter(self.engine) as counter:
+            cached = self.client.get(url, headers=headers)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(cached.get_data(), response.get_data())
+        self.assertEqual(cached.headers["ETag"], response.headers["ETag"])
+
+        self.app.config["metaserv_compression"] = False
+        response = self.client.get(url, headers=headers)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_etag(self):
+        _add_database(self.app, "db1", 2)
+        url = "/meta/v1/db/db1/tables/"
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+        self.assertNotIn("Cache-Control", response.headers)
+        with _StatementCounter(self.engine) as counter:
+            response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertEqual(counter.count, 1)
+        # Weak comparison, e.g. for proxies which re-encode the body
+        response = self.client.get(url, headers={"If-None-Match": "W/" + etag})
+        self.assertEqual(response.status_code, 304)
+        # Any write invalidates it
+        _add_database(self.app, "db2", 1)
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_cache_control(self):
+        self.app.config["metaserv_cache_control"] = "public, max-age=60"
+        _add_database(self.app, "db1", 1)
+        response = self.client.get("/meta/v1/db/")
+        self.assertEqual(response.headers["Cache-Control"],
+                         "public, max-age=60")
+
+    def test_session_per_request(self):
+        with self.app.test_request_context("/meta/v1/db/"):
+            session = api_v1.Session()
+            self.assertIs(api_v1.Session(), session)
+        with self.app.test_request_context("/meta/v1/db/"):
+            self.assertIsNot(api_v1.Session(), session)
+        _add_database(self.app, "db1", 1)
+        self.client.get("/meta/v1/db/")
+        _, data = self._count_get("/meta/v1/metrics/")
+        self.assertEqual(data["pool"]["checkouts"], 3)
+        self.assertEqual(data["pool"]["timeouts"], 0)
+
+    def test_server_timing(self):
+        _add_database(self.app, "db1", 4)
+        url = "/meta/v1/db/db1/tables/"
+        self.client.get(url)
+        with _StatementCounter(self.engine) as counter, \
+                self.assertLogs(level="INFO") as logs:
+            response = self.client.get(url)
+        timing = response.headers["Server-Timing"]
+        self.assertIn('desc="%d statements, ' % counter.count, timing)
+        self.assertIn("serialize;dur=", timing)
+        record = json.loads(logs.output[-1].split("metaserv request ")[1])
+        self.assertEqual(record["endpoint"], "metaserv_v1.tables")
+        self.assertEqual(record["statements"], counter.count)
+        # 4 tables of 3 columns, unless served from the snapshot
+        self.assertGreaterEqual(record["rows"], 1)
+        self.app.config["metaserv_server_timing"] = False
+        self.assertNotIn("Server-Timing", self.client.get(url).headers)
+
+
+class TestCompressionCache(unittest.TestCase):
+
+    def test_size_bound(self):
+        cache = CompressionCache(max_entries=10, max_bytes=100)
+        for key in "abc":
+            cache.put(key, ("application/json", "gzip", b"x" * 40))
+        # a was evicted to stay within 100 bytes
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("b"))
+        cache.put("d", ("application/json", "gzip", b"x" * 40))
+        # c was the least recently used
+        self.assertIsNone(cache.get("c"))
+        self.assertIsNotNone(cache.get("b"))
+        # Too large to be cached at all
+        cache.put("e", ("application/json", "gzip", b"x" * 101))
+        self.assertIsNone(cache.get("e"))
+        self.assertIsNotNone(cache.get("d"))
+        # Replacing an entry does not count it twice
+        for _ in range(3):
+            cache.put("d", ("application/json", "gzip", b"x" * 40))
+        self.assertIsNotNone(cache.get("b"))
+
+
+class TestPool(unittest.TestCase):
+
+    def test_read_pool_options(self):
+        (fd, fName) = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as config_file:
+            config_file.write("""
+[mysql]
+user = metaserv
+password = 50%off
+
+[pool]
+pool_size = 3
+pool_pre_ping = true
+pool_timeout = 2.5
+""")
+        self.assertEqual(read_pool_options(fName),
+                         {"pool_size": 3, "pool_pre_ping": True,
+                          "pool_timeout": 2.5})
+        os.remove(fName)
+
+    def test_pool_exhausted(self):
+        engine = create_engine("sqlite://", poolclass=QueuePool,
+                               pool_size=1, max_overflow=0,
+                               pool_timeout=0.01)
+        app = Flask(__name__)
+        app.config["default_engine"] = engine
+        app.register_blueprint(api_v1.metaserv_api_v1,
+                               url_prefix='/meta/v1')
+        client = app.test_client()
+        connection = engine.connect()
+        response = client.get("/meta/v1/db/")
+        self.assertEqual(response.status_code, 503)
+        connection.close()
+        response = client.get("/meta/v1/metrics/")
+        self.assertEqual(json.loads(response.get_data(as_text=True))
+                         ["pool"]["timeouts"], 1)
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.app = _make_app()
+        self.client = self.app.test_client()
+        _add_database(self.app, "db0", 1)
+
+    def test_deadline_exceeded(self):
+        self.app.config["metaserv_statement_timeouts"] = {
+            "metaserv_v1.databases": 0}
+        self.app.config["metaserv_retry_after"] = 7
+        response = self.client.get("/meta/v1/db/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "7")
+        # Other endpoints keep the default deadline
+        self.assertEqual(self.client.get("/meta/v1/db/db0/").status_code, 200)
+
+    def test_watchdog(self):
+        watchdog = Watchdog()
+        calls = []
+        now = time.time()
+        watchdog.schedule(now + 0.1, calls.append, "b")
+        cancelled = watchdog.schedule(now + 0.05, calls.append, "x")
+        watchdog.schedule(now, calls.append, "a")
+        watchdog.cancel(cancelled)
+        # Many cancelled entries do not accumulate
+        for i in range(1000):
+            watchdog.cancel(watchdog.schedule(now + 60, calls.append, i))
+        self.assertLess(len(watchdog._entries), 200)
+        time.sleep(0.3)
+        self.assertEqual(calls, ["a", "b"])
+
+    def test_slow_statement_cancelled(self):
+        self.app.config["metaserv_statement_timeout"] = 0.2
+        engine = self.app.config["default_engine"]
+        slow = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL "
+                "SELECT i + 1 FROM n) SELECT count(*) FROM n")
+        with self.app.test_request_context("/meta/v1/db/"):
+            start_request_deadline()
+            start = time.time()
+            with self.assertRaises(DeadlineExceeded):
+                engine.execute(slow)
+            self.assertLess(time.time() - start, 5)
+        # The connection is still usable afterwards
+        self.assertEqual(self.client.get("/meta/v1/db/").status_code, 200)
+
+
+class TestApiV1Snapshot(TestApiV1):
+    """Same checks, with the in-memory snapshot enabled."""
+
+    def setUp(self):
+        TestApiV1.setUp(self)
+        self.app.config["metaserv_snapshot"] = True
+
+    def test_tables_statement_count_is_flat(self):
+        _add_database(self.app, "db1", 5)
+        self._count_get("/meta/v1/db/db1/tables/")
+        # Only the generation is checked once the snapshot is built
+        count, data = self._count_get("/meta/v1/db/db1/tables/")
+        self.assertEqual(count, 1)
+        self.assertEqual(len(data["results"]["tables"]), 5)
+
+    def test_rebuild_on_generation_change(self):
+        _add_database(self.app, "db1", 1)
+        _, data = self._count_get("/meta/v1/db/")
+        self.assertEqual([db["name"] for db in data["results"]], ["db1"])
+        _add_database(self.app, "db2", 2)
+        _, data = self._count_get("/meta/v1/db/")
+        self.assertEqual([db["name"] for db in data["results"]],
+                         ["db1", "db2"])
+        _, data = self._count_get("/meta/v1/db/db2/tables/t1/")
+        self.assertEqual(data["result:"]["name"], "t1")
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
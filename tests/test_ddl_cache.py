@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the SHOW CREATE TABLE cache.
+"""
+
+# standard library
+import logging as log
+import unittest
+
+# local
+from lsst.dax.metaserv.ddl_cache import DdlCache
+
+
+class _Result(object):
+
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+
+class _Server(object):
+    """Answers the two statements issued by DdlCache, like MySQL."""
+
+    def __init__(self):
+        self.update_time = 1
+        self.statements = []
+
+    def execute(self, statement, **params):
+        statement = str(statement)
+        self.statements.append(statement)
+        if statement.startswith("SHOW CREATE TABLE"):
+            name = statement.split()[-1]
+            return _Result({"Table": name,
+                            "Create Table": "CREATE TABLE %s (v%d int)" %
+                                            (name, self.update_time)})
+        return _Result((0, self.update_time))
+
+    def count(self, prefix):
+        return len([s for s in self.statements if s.startswith(prefix)])
+
+
+class TestDdlCache(unittest.TestCase):
+
+    def test_hits_and_revalidation(self):
+        server = _Server()
+        cache = DdlCache(ttl=0)
+        ddl = cache.get(server, "db", "t")
+        self.assertEqual(ddl["Create Table"], "CREATE TABLE db.t (v1 int)")
+        # Expired, but the table did not change
+        self.assertEqual(cache.get(server, "db", "t"), ddl)
+        self.assertEqual(server.count("SHOW CREATE TABLE"), 1)
+        # The table changed
+        server.update_time = 2
+        ddl = cache.get(server, "db", "t")
+        self.assertEqual(ddl["Create Table"], "CREATE TABLE db.t (v2 int)")
+        self.assertEqual(server.count("SHOW CREATE TABLE"), 2)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"],
+                          stats["revalidations"]), (1, 2, 1))
+
+    def test_ttl_and_eviction(self):
+        server = _Server()
+        cache = DdlCache(max_entries=2, ttl=3600)
+        for table in ("t1", "t2", "t1", "t3", "t1"):
+            cache.get(server, "db", table)
+        # Nothing revalidated within the TTL, t2 was the least recently
+        # used entry when t3 was added
+        self.assertEqual(len(server.statements), 3 * 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.get(server, "db", "t2")
+        self.assertEqual(server.count("SHOW CREATE TABLE"), 4)
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the metadata generation counter, and the upgrade
+of existing stores.
+"""
+
+# standard library
+import logging as log
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+# third party
+from sqlalchemy import create_engine
+
+# local
+from lsst.dax.metaserv.model import init_db, session_maker, MSGeneration, \
+    bump_generation, get_generation, upgrade_db
+
+
+class TestGeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # A file, so that each session has its own connection
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory, "meta.db"),
+            connect_args={"check_same_thread": False})
+        init_db(self.engine)
+        self.Session = session_maker(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_init_db_creates_row(self):
+        init_db(self.engine)
+        session = self.Session()
+        self.assertEqual(session.query(MSGeneration).count(), 1)
+        self.assertEqual(get_generation(session), 0)
+        session.close()
+
+    def test_minimum(self):
+        session = self.Session()
+        self.assertEqual(bump_generation(session, 10), 10)
+        self.assertEqual(bump_generation(session), 11)
+        self.assertEqual(bump_generation(session, 5), 12)
+        session.commit()
+        session.close()
+
+    def test_concurrent_bumps(self):
+        first = self.Session()
+        second = self.Session()
+        self.assertEqual(get_generation(second), 0)
+        second.commit()
+        self.assertEqual(bump_generation(first), 1)
+
+        # The second writer waits for the first one to commit, then
+        # increments what it committed
+        results = []
+        writer = threading.Thread(
+            target=lambda: results.append(bump_generation(second)))
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())
+        first.commit()
+        writer.join()
+        second.commit()
+        self.assertEqual(results, [2])
+
+        session = self.Session()
+        self.assertEqual(get_generation(session), 2)
+        for session in first, second, session:
+            session.close()
+
+
+class TestUpgrade(unittest.TestCase):
+
+    def test_upgrade_db(self):
+        engine = create_engine("sqlite://")
+        init_db(engine)
+        # As created by an older version
+        engine.execute("DROP TABLE MSGeneration")
+        engine.execute("DROP INDEX IDX_MSDatabaseTable_schema_name")
+        engine.execute("DROP INDEX IDX_MSDatabaseColumn_table_id")
+        self.assertEqual(upgrade_db(engine),
+                         ["IDX_MSDatabaseTable_schema_name",
+                          "IDX_MSDatabaseColumn_table_id"])
+        session = session_maker(engine)()
+        self.assertEqual(session.query(MSGeneration).count(), 1)
+        session.close()
+        # Nothing left to do
+        self.assertEqual(upgrade_db(engine), [])
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+# LSST Data Management System
+# Copyright 2017 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+
+"""
+This is a unittest for the on-disk cache of parsed schema files.
+"""
+
+# standard library
+import logging as log
+import os
+import shutil
+import tempfile
+import unittest
+
+# local
+from lsst.dax.metaserv import schema_utils
+from lsst.dax.metaserv.parse_cache import ParseCache
+from lsst.dax.metaserv.schema_utils import parse_schema
+
+DDL = """
+CREATE TABLE %s
+    -- <descr>A table.</descr>
+(
+    id BIGINT NOT NULL,
+        -- <descr>Identifier.</descr>
+        -- <ucd>meta.id</ucd>
+    ra DOUBLE DEFAULT 0,
+        -- <unit>deg</unit>
+    PRIMARY KEY (id)
+) ENGINE=MyISAM;
+"""
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, table_name):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as ddl:
+            ddl.write(DDL % table_name)
+        return path
+
+    def _entries(self):
+        return sorted(os.listdir(self.cache.directory))
+
+    def test_warm_run_skips_parsing(self):
+        path = self._write("a.sql", "t")
+        expected = parse_schema(path)
+        self.assertEqual(parse_schema(path, self.cache), expected)
+        self.assertEqual(len(self._entries()), 1)
+
+        parse_lines = schema_utils.parse_schema_stream
+
+        def fail(lines):
+            raise AssertionError("parsed again")
+        schema_utils.parse_schema_stream = fail
+        try:
+            self.assertEqual(parse_schema(path, self.cache), expected)
+            # Same content under another name
+            self.assertEqual(parse_schema(self._write("b.sql", "t"),
+                                          self.cache), expected)
+        finally:
+            schema_utils.parse_schema_stream = parse_lines
+
+        # A change of content is a new entry
+        changed = parse_schema(self._write("a.sql", "u"), self.cache)
+        self.assertEqual(list(changed), ["u"])
+        self.assertEqual(len(self._entries()), 2)
+
+    def test_corrupted_entry(self):
+        path = self._write("a.sql", "t")
+        parse_schema(path, self.cache)
+        entry, = self._entries()
+        with open(os.path.join(self.cache.directory, entry), "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual(parse_schema(path, self.cache), parse_schema(path))
+
+    def test_eviction(self):
+        paths = [self._write("%d.sql" % i, "t%d" % i) for i in range(4)]
+        parse_schema(paths[0], self.cache)
+        entry_size = os.path.getsize(
+            os.path.join(self.cache.directory, self._entries()[0]))
+        self.cache.max_bytes = 2 * entry_size + entry_size // 2
+        for path in paths[1:]:
+            parse_schema(path, self.cache)
+        self.assertEqual(len(self._entries()), 2)
+        self.cache.clear()
+        self.assertEqual(self._entries(), [])
+
+    def test_unwritable_cache(self):
+        path = self._write("a.sql", "t")
+        # The cache directory is a file
+        with open(self.cache.directory, "w"):
+            pass
+        self.assertEqual(parse_schema(path, self.cache), parse_schema(path))
+
+
+def main():
+    log.basicConfig(
+        format='%(asctime)s %(name)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %I:%M:%S',
+        level=log.DEBUG)
+
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
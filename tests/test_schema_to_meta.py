@@ -33,7 +33,12 @@ import tempfile
 import unittest
 
 # local
-from lsst.dax.metaserv.schema_utils import parse_schema
+from lsst.dax.metaserv.schema_utils import parse_schema, parse_schemas, \
+    parse_schema_stream, parse_schema_string, parse_schema_mmap, \
+    schema_as_dicts, schema_from_dicts, ParsedColumn, ParsedTable, \
+    SchemaParseError
+
+from schema_regex_parser import parse_schema_regex
 
 
 class TestS2M(unittest.TestCase):
@@ -196,6 +201,147 @@ CREATE TABLE t (
         self.assertEqual(parsed_tables["t"]["indexes"][4]["columns"], "xx, yy")
         self.assertEqual(parsed_tables["t"]["indexes"][3]["type"], "UNIQUE")
 
+    def test_same_as_regex_parser(self):
+        """
+        The single-pass parser gives the same result as the original one.
+        """
+        (fd, fName) = tempfile.mkstemp()
+        temp_file = os.fdopen(fd, "w")
+        temp_file.write("""
+-- CREATE TABLE tDummy (
+CREATE TABLE t1
+    -- <descr>Table t1,
+    -- on two lines.</descr>
+    -- still the table description
+(
+    id BIGINT NOT NULL,
+        -- <descr>Identifier.</descr>
+        -- <ucd>meta.id;src</ucd>
+    ra DOUBLE NULL DEFAULT 0.5,
+        -- <descr>Right
+        -- ascension.
+        --
+        --   - yaml item
+        -- </descr>
+        -- <unit>deg</unit> <ucd>pos.eq.ra</ucd>
+    flag BIT(1) DEFAULT 0,
+    name VARCHAR(64) NOT NULL DEFAULT 'none',
+        -- <unit></unit>
+    ts TIMESTAMP,
+    PRIMARY KEY (id),
+    UNIQUE UQ_name (name ASC, ts DESC),
+    KEY IDX_ra (ra)
+) TYPE=MyISAM;
+
+CREATE TABLE t2 (
+    f FLOAT(0),
+
+    c CHAR(3)
+    )
+) ENGINE = InnoDB ;
+""")
+        temp_file.close()
+        parsed_tables = parse_schema(fName)
+        self.assertEqual(parsed_tables, parse_schema_regex(fName))
+        self.assertEqual(sorted(parsed_tables), ["t1", "t2"])
+        self.assertEqual(parsed_tables["t1"]["engine"], "MyISAM")
+
+    def test_parse_schemas(self):
+        """
+        Parse several files in a process pool, with one missing.
+        """
+        paths = []
+        for i in range(3):
+            (fd, fName) = tempfile.mkstemp()
+            temp_file = os.fdopen(fd, "w")
+            temp_file.write("CREATE TABLE t%d (\n    id int\n);\n" % i)
+            temp_file.close()
+            paths.append(fName)
+        missing = paths[0] + ".missing"
+        paths.insert(1, missing)
+        results = parse_schemas(paths, max_workers=2)
+        self.assertEqual([result.path for result in results], paths)
+        self.assertIsNone(results[1].schema)
+        self.assertIsInstance(results[1].error, IOError)
+        for i, result in enumerate(results[:1] + results[2:]):
+            self.assertIsNone(result.error)
+            self.assertEqual(result.schema, parse_schema(result.path))
+            self.assertEqual(list(result.schema), ["t%d" % i])
+
+    def test_front_ends(self):
+        """
+        Parse the same schema from a string, a stream and a memory map.
+        """
+        ddl = ("CREATE TABLE t\r\n"
+               "    -- <descr>Table t.</descr>\r\n"
+               "(\r\n"
+               "    id int,\r\n"
+               "        -- <descr>Some\r\n"
+               "        -- identifier.</descr>\r\n"
+               "        -- <unit>m</unit>\r\n"
+               "    PRIMARY KEY (id)\r\n"
+               ") ENGINE=MyISAM;\r\n")
+        (fd, fName) = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(ddl.encode("utf-8"))
+        parsed_tables = parse_schema(fName)
+        self.assertEqual(parsed_tables["t"]["columns"][0]["description"],
+                         "Some identifier.")
+        self.assertEqual(parse_schema_string(ddl), parsed_tables)
+        self.assertEqual(parse_schema_mmap(fName, "utf-8"), parsed_tables)
+        with open(fName) as lines:
+            self.assertEqual(parse_schema_stream(lines), parsed_tables)
+        self.assertEqual(parse_schema_stream(iter([])), {})
+
+    def test_errors(self):
+        """
+        Errors are raised as exceptions.
+        """
+        with self.assertRaises(IOError):
+            parse_schema("/nonexistent/schema.sql")
+        (fd, fName) = tempfile.mkstemp()
+        temp_file = os.fdopen(fd, "w")
+        temp_file.write("CREATE TABLE t (\n    id int,\n    g GEOMETRY\n);\n")
+        temp_file.close()
+        with self.assertRaises(SchemaParseError) as error:
+            parse_schema_mmap(fName)
+        self.assertEqual(error.exception.lineno, 3)
+        self.assertEqual(error.exception.line, "    g GEOMETRY")
+        self.assertEqual(error.exception.path, fName)
+        self.assertIn(":3: KeyError", str(error.exception))
+
+    def test_records(self):
+        """
+        Parsed records read like the dicts of the original parser.
+        """
+        parsed_tables = parse_schema_string("""
+CREATE TABLE t
+    -- <descr>Table t.</descr>
+(
+    id int NOT NULL,
+        -- <ucd>meta.id</ucd>
+    PRIMARY KEY (id)
+);
+""")
+        table = parsed_tables["t"]
+        self.assertIsInstance(table, ParsedTable)
+        self.assertEqual(sorted(table), ["columns", "description", "indexes"])
+        self.assertNotIn("engine", table)
+        self.assertEqual(table.get("engine", "none"), "none")
+        with self.assertRaises(KeyError):
+            table["engine"]
+        column = table["columns"][0]
+        self.assertIsInstance(column, ParsedColumn)
+        self.assertEqual(column.ucd, column["ucd"])
+        self.assertEqual(column.get("unit", ""), "")
+        self.assertEqual(dict(column), {
+            "name": "id", "datatype": "int", "arraysize": None,
+            "nullable": False, "ucd": "meta.id"})
+        as_dicts = schema_as_dicts(parsed_tables)
+        self.assertIs(type(as_dicts["t"]["indexes"][0]), dict)
+        self.assertEqual(as_dicts, parsed_tables)
+        self.assertEqual(schema_from_dicts(as_dicts), parsed_tables)
+
 
 def main():
     log.basicConfig(